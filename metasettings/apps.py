@@ -0,0 +1,27 @@
+import logging
+
+from django.apps import AppConfig
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+class MetasettingsConfig(AppConfig):
+    name = "metasettings"
+
+    def ready(self):
+        from . import settings
+
+        if settings.WARMUP:
+            from .warmup import warmup
+
+            steps = warmup(settings.WARMUP if settings.WARMUP is not True else None)
+
+            for name, duration, error in steps:
+                # Failures are already logged as warnings by warmup()
+                LOGGER.info(
+                    "Warmed up %s in %.2fms%s",
+                    name,
+                    duration * 1000,
+                    " (failed)" if error is not None else "",
+                )
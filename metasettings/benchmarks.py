@@ -0,0 +1,244 @@
+import decimal
+import json
+import platform
+import statistics
+import sys
+import timeit
+
+import django
+
+from django.apps.registry import Apps
+from django.db import models
+from django.template import Context, Template
+from django.test.client import RequestFactory
+
+from . import settings
+from .fields import CurrencyField
+from .helpers import get_client_ip
+from .models import (
+    Currency,
+    CurrencyRate,
+    Money,
+    Timezone,
+    convert_amount,
+    convert_amounts,
+)
+from .rates import RateTable
+from .timezone import time_zone_by_country_and_region
+
+
+# Benchmarks run on fixed rates so results do not depend on the database.
+RATES = {
+    "EUR": "0.92",
+    "USD": "1.00",
+    "GBP": "0.79",
+    "JPY": "149.52",
+    "CHF": "0.88",
+    "CAD": "1.36",
+}
+
+
+def get_rate_table():
+    return RateTable(
+        (currency, CurrencyRate(currency=currency, rate=rate))
+        for currency, rate in RATES.items()
+        if currency in dict(settings.CURRENCY_CHOICES)
+    )
+
+
+def bench_convert_amount():
+    rates = get_rate_table()
+    amount = decimal.Decimal("15.50")
+
+    return lambda: convert_amount("EUR", "USD", amount, rates=rates)
+
+
+def bench_convert_amounts():
+    rates = get_rate_table()
+    codes = sorted(rates)
+    from_currencies = [codes[i % len(codes)] for i in range(1000)]
+    amounts = [decimal.Decimal(i) / 4 for i in range(1000)]
+
+    return lambda: convert_amounts(from_currencies, "EUR", amounts, rates=rates)
+
+
+def bench_money_arithmetic():
+    a, b = Money("15.50", "EUR"), Money("4.25", "EUR")
+
+    def run():
+        return (a + b) * 3 - b > a
+
+    return run
+
+
+def bench_money_format():
+    money = Money("1234567.891", "EUR")
+
+    return lambda: str(money)
+
+
+def bench_currency():
+    other = Currency("USD")
+
+    def run():
+        currency = Currency("EUR")
+
+        return currency == "EUR", currency == other
+
+    return run
+
+
+def bench_timezone():
+    other = Timezone("Asia/Tokyo")
+
+    def run():
+        zone = Timezone("Europe/Paris")
+
+        return zone == "Europe/Paris", zone == other
+
+    return run
+
+
+def bench_currency_field():
+    # A model of its own registry, so running benchmarks does not register
+    # a model in projects
+    class Instance(models.Model):
+        currency = CurrencyField()
+
+        class Meta:
+            apps = Apps()
+            app_label = "metasettings"
+
+    instance = Instance()
+
+    def run():
+        instance.currency = "EUR"
+
+        return instance.currency
+
+    return run
+
+
+def bench_time_zone_by_country_and_region():
+    return lambda: (
+        time_zone_by_country_and_region("US", "NY"),
+        time_zone_by_country_and_region("FR"),
+    )
+
+
+def bench_get_client_ip():
+    request = RequestFactory().get(
+        "/", HTTP_X_FORWARDED_FOR="unknown, 78.192.244.8, 10.0.0.1"
+    )
+
+    return lambda: get_client_ip(request)
+
+
+def bench_template_convert_amount():
+    template = Template(
+        "{% load metasettings_tags %}"
+        "{% convert_amount 'EUR' 'USD' 15 ceil=1 rates=rates as amount %}"
+        "{{ amount }}"
+    )
+    rates = get_rate_table()
+
+    return lambda: template.render(Context({"rates": rates}))
+
+
+def bench_template_request_tags():
+    template = Template(
+        "{% load metasettings_tags %}"
+        "{% get_currency_from_request request as currency %}"
+        "{% get_timezone_from_request request as timezone %}"
+        "{{ currency }} {{ timezone }}"
+    )
+    request = RequestFactory().get("/")
+    request.COOKIES = {
+        settings.CURRENCY_COOKIE_NAME: "USD",
+        settings.TIMEZONE_COOKIE_NAME: "Asia/Tokyo",
+    }
+
+    return lambda: template.render(Context({"request": request}))
+
+
+BENCHMARKS = (
+    ("convert_amount", bench_convert_amount),
+    ("convert_amounts", bench_convert_amounts),
+    ("money_arithmetic", bench_money_arithmetic),
+    ("money_format", bench_money_format),
+    ("currency", bench_currency),
+    ("timezone", bench_timezone),
+    ("currency_field", bench_currency_field),
+    ("time_zone_by_country_and_region", bench_time_zone_by_country_and_region),
+    ("get_client_ip", bench_get_client_ip),
+    ("template_convert_amount", bench_template_convert_amount),
+    ("template_request_tags", bench_template_request_tags),
+)
+
+
+def run(names=None, number=None, repeat=5):
+    """Time the benchmarks in `names`, every one by default, `repeat` times
+    `number` calls, the number of calls being calibrated to last at least
+    0.2 seconds when not given.
+
+    Returns a JSON serializable dict, timings being in seconds per call.
+    """
+    benchmarks = {}
+
+    for name, setup in BENCHMARKS:
+        if names is not None and name not in names:
+            continue
+
+        timer = timeit.Timer(setup())
+
+        calls = number or timer.autorange()[0]
+
+        timings = [t / calls for t in timer.repeat(repeat=repeat, number=calls)]
+
+        benchmarks[name] = {
+            "number": calls,
+            "repeat": repeat,
+            "best": min(timings),
+            "median": statistics.median(timings),
+        }
+
+    return {
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "platform": sys.platform,
+        "benchmarks": benchmarks,
+    }
+
+
+def compare(results, baseline, threshold=0.2):
+    """Compare the best timings of `results` with those of `baseline`.
+
+    Returns a dict mapping benchmarks of both to their timing ratio and a
+    status: "regression" when slower by more than `threshold`,
+    "improvement" when faster by more than `threshold`, "unchanged"
+    otherwise.
+    """
+    comparison = {}
+
+    for name, result in results["benchmarks"].items():
+        reference = baseline.get("benchmarks", {}).get(name)
+
+        if not reference or not reference.get("best"):
+            continue
+
+        ratio = result["best"] / reference["best"]
+
+        if ratio > 1 + threshold:
+            status = "regression"
+        elif ratio < 1 - threshold:
+            status = "improvement"
+        else:
+            status = "unchanged"
+
+        comparison[name] = {"ratio": round(ratio, 3), "status": status}
+
+    return comparison
+
+
+def dumps(results):
+    return json.dumps(results, indent=2, sort_keys=True)
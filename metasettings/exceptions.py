@@ -4,3 +4,11 @@ class CurrencyMismatch(Exception):
 
 class ExchangeRateNotFound(Exception):
     pass
+
+
+class InvalidIPIndex(Exception):
+    pass
+
+
+class InvalidRateSnapshot(Exception):
+    pass
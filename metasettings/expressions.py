@@ -0,0 +1,147 @@
+from django.db import models
+from django.db.models.expressions import SQLiteNumericMixin
+from django.db.models.functions import Coalesce, ExtractMonth, ExtractYear
+
+from .models import CurrencyRate
+from .rates import RateTable
+
+
+class ConvertedAmount(SQLiteNumericMixin, models.Case):
+    """Convert the `amount` column of each row from its `currency` column to
+    `to`, in the database:
+
+        Project.objects.annotate(
+            converted=ConvertedAmount("amount", "currency", to="EUR")
+        ).aggregate(total=Sum("converted"))
+
+    Factors come from the rates of the given period, or from `rates` when a
+    `RateTable` is given, and are inlined in the query. Rows of currencies
+    without rate are converted to NULL.
+    """
+
+    def __init__(
+        self,
+        amount,
+        currency,
+        to,
+        year=None,
+        month=None,
+        rates=None,
+        output_field=None,
+    ):
+        if rates is None:
+            rates = CurrencyRate.objects.get_rate_table(year=year, month=month)
+        elif not isinstance(rates, RateTable):
+            rates = RateTable(rates)
+
+        if isinstance(amount, str):
+            amount = models.F(amount)
+
+        cases = []
+
+        for code in sorted(rates):
+            if code == to:
+                then = amount
+            elif rates[code].rate and to in rates and rates[to].rate:
+                then = amount * models.Value(+rates.factor(code, to))
+            else:
+                continue
+
+            cases.append(models.When(**{currency: code, "then": then}))
+
+        if to not in rates:
+            cases.append(models.When(**{currency: to, "then": amount}))
+
+        super(ConvertedAmount, self).__init__(
+            *cases,
+            default=models.Value(None),
+            output_field=output_field or models.DecimalField()
+        )
+
+
+class Quotient(models.ExpressionWrapper):
+    """Decimal division of two expressions."""
+
+    def __init__(self, dividend, divisor):
+        super(Quotient, self).__init__(
+            dividend / divisor, output_field=models.DecimalField()
+        )
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # SQLite has no decimal type and truncates the quotient of whole
+        # rates, which it stores as integers: only promote the dividend.
+        dividend, divisor = self.expression.get_source_expressions()
+
+        dividend_sql, dividend_params = compiler.compile(dividend)
+        divisor_sql, divisor_params = compiler.compile(divisor)
+
+        return (
+            "(%s * 1.0 / %s)" % (dividend_sql, divisor_sql),
+            dividend_params + divisor_params,
+        )
+
+
+class Factor(models.Subquery):
+    """Factor converting `currency` amounts to `to` at the rates of a period,
+    as a single subquery on `CurrencyRate`.
+
+    It is NULL when the period lacks either rate.
+    """
+
+    def __init__(self, currency, to, year=None, month=None):
+        queryset = CurrencyRate.objects.filter(
+            models.Q(currency=currency) | models.Q(currency=to)
+        )
+
+        if year is None:
+            queryset = queryset.filter(year__isnull=True, month__isnull=True)
+        else:
+            queryset = queryset.filter(year=year, month=month, day__isnull=True)
+
+        def get_rate(code):
+            return models.Max(
+                models.Case(models.When(currency=code, then=models.F("rate")))
+            )
+
+        # Rows of the period are filtered on the year, grouping by it
+        # aggregates them into a single row
+        queryset = (
+            queryset.order_by()
+            .values("year")
+            .annotate(factor=Quotient(get_rate(to), get_rate(currency)))
+            .values("factor")
+        )
+
+        super(Factor, self).__init__(queryset, output_field=models.DecimalField())
+
+
+class HistoricalConvertedAmount(SQLiteNumericMixin, models.ExpressionWrapper):
+    """Convert the `amount` column of each row from its `currency` column to
+    `to` at the rates of the month of its `date` column, in a single query:
+
+        Pledge.objects.aggregate(
+            total=Sum(HistoricalConvertedAmount("amount", "currency", "date", to="EUR"))
+        )
+
+    Like `convert_amount`, rows are converted with the default rates when
+    the month lacks the rate of either currency.
+    """
+
+    def __init__(self, amount, currency, date, to, output_field=None):
+        if isinstance(amount, str):
+            amount = models.F(amount)
+
+        date = models.ExpressionWrapper(
+            models.OuterRef(date), output_field=models.DateField()
+        )
+
+        currency = models.OuterRef(currency)
+
+        factor = Coalesce(
+            Factor(currency, to, ExtractYear(date), ExtractMonth(date)),
+            Factor(currency, to),
+        )
+
+        super(HistoricalConvertedAmount, self).__init__(
+            amount * factor, output_field=output_field or models.DecimalField()
+        )
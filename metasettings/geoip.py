@@ -0,0 +1,445 @@
+import asyncio
+import logging
+import os
+import threading
+import weakref
+import zlib
+
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import repeat
+
+from . import settings
+from .cache import LRUCache
+from .helpers import get_network_key, is_public_ip
+from .ipindex import IPRangeIndex
+from .util import batches
+
+
+logger = logging.getLogger("django.metasettings")
+
+_missing = object()
+
+
+class GeoIPReaders(object):
+    """Process-wide registry of GeoIP readers, one per open mode.
+
+    Readers are created lazily on first access and shared by every thread
+    of the process, so the database is opened once per worker instead of
+    once per lookup.
+    """
+
+    def __init__(self):
+        self._readers = {}
+        self._lock = threading.Lock()
+
+    def get(self, mode=None):
+        mode = mode or settings.GEOIP_MODE
+
+        reader = self._readers.get(mode)
+
+        if reader is None:
+            with self._lock:
+                reader = self._readers.get(mode)
+
+                if reader is None:
+                    reader = self.open(mode)
+
+                    self._readers[mode] = reader
+
+        return reader
+
+    def open(self, mode):
+        if settings.IP_INDEX_PATH:
+            if mode not in ("auto", "mmap", "memory"):
+                raise ValueError("Invalid GeoIP mode '{}'".format(mode))
+
+            return IPRangeIndex.open(settings.IP_INDEX_PATH, memory=mode == "memory")
+
+        from .compat import GeoIP, GEOIP_MODES
+
+        try:
+            cache = GEOIP_MODES[mode]
+        except KeyError:
+            raise ValueError(
+                "Invalid GeoIP mode '{}', expected one of: {}".format(
+                    mode, ", ".join(sorted(GEOIP_MODES))
+                )
+            )
+
+        return GeoIP(cache=cache)
+
+    def clear(self):
+        with self._lock:
+            self._readers = {}
+
+    def __contains__(self, mode):
+        return mode in self._readers
+
+
+readers = GeoIPReaders()
+
+
+def get_reader(mode=None):
+    return readers.get(mode)
+
+
+resolutions = LRUCache(maxsize=settings.GEOIP_CACHE_SIZE, ttl=settings.GEOIP_CACHE_TTL)
+
+
+# Readers which cannot resolve cities, detected on first query
+country_readers = weakref.WeakSet()
+
+
+def locate(reader, ip_address):
+    """Return a `(country_code, region_code)` tuple with a single query.
+
+    The city database is used when available to retrieve the region, the
+    country database otherwise.
+    """
+    if reader not in country_readers and hasattr(reader, "city"):
+        from .compat import GeoIPException
+
+        try:
+            data = reader.city(ip_address)
+        except GeoIPException:
+            # No city database
+            country_readers.add(reader)
+        else:
+            if not data:
+                return None
+
+            return data["country_code"], data["region"] or ""
+
+    country_code = reader.country_code(ip_address)
+
+    if not country_code:
+        return None
+
+    return country_code, ""
+
+
+def get_cache_key(method, ip_address):
+    """Return the key of `ip_address` in the resolution cache, or None when
+    it must not be looked up.
+    """
+    if not ip_address or not is_public_ip(ip_address):
+        return None
+
+    return (
+        getattr(method, "__name__", method),
+        get_network_key(
+            ip_address,
+            ipv4_prefix=settings.GEOIP_CACHE_IPV4_PREFIX,
+            ipv6_prefix=settings.GEOIP_CACHE_IPV6_PREFIX,
+        ),
+    )
+
+
+def query(reader, method, ip_address):
+    try:
+        if callable(method):
+            return method(reader, ip_address)
+
+        return getattr(reader, method)(ip_address)
+    except Exception as e:
+        logger.warning(e)
+
+    return None
+
+
+def lookup(method, ip_address):
+    """Call `method` ("country_code", "city", ...) of the shared reader, or
+    `method(reader, ip_address)` when given a callable such as `locate`.
+
+    Results are cached per network, lookup errors are logged and cached as
+    None. Private, loopback and reserved addresses are never looked up.
+    """
+    key = get_cache_key(method, ip_address)
+
+    if key is None:
+        return None
+
+    result = resolutions.get(key, _missing)
+
+    if result is not _missing:
+        return result
+
+    return resolve(key, method, ip_address)
+
+
+def resolve(key, method, ip_address):
+    reader = get_reader()
+
+    shared_cache = get_shared_cache()
+
+    if shared_cache is None:
+        result = query(reader, method, ip_address)
+    else:
+        shared_key = get_shared_cache_key(key, get_database_version(reader))
+
+        try:
+            result = shared_cache.get(shared_key, _missing)
+        except Exception as e:
+            # An unavailable shared cache must not break lookups
+            logger.warning(e)
+
+            result = _missing
+
+        if result is _missing:
+            result = query(reader, method, ip_address)
+
+            try:
+                shared_cache.set(shared_key, result, settings.GEOIP_SHARED_CACHE_TTL)
+            except Exception as e:
+                logger.warning(e)
+
+    resolutions.set(key, result)
+
+    return result
+
+
+def get_shared_cache():
+    """Return the Django cache shared between processes, if configured."""
+    if not settings.GEOIP_SHARED_CACHE_ALIAS:
+        return None
+
+    from django.core.cache import caches
+
+    return caches[settings.GEOIP_SHARED_CACHE_ALIAS]
+
+
+def get_database_files():
+    """Return the paths of the GeoIP database files configured in Django
+    settings.
+    """
+    from django.conf import settings as django_settings
+
+    path = getattr(django_settings, "GEOIP_PATH", None)
+
+    if not path:
+        return []
+
+    path = str(path)
+
+    if os.path.isfile(path):
+        return [path]
+
+    return [
+        os.path.join(path, getattr(django_settings, name, default))
+        for name, default in (
+            ("GEOIP_CITY", "GeoLite2-City.mmdb"),
+            ("GEOIP_COUNTRY", "GeoLite2-Country.mmdb"),
+        )
+    ]
+
+
+# Versions of open readers, computed when first needed
+versions = weakref.WeakKeyDictionary()
+
+
+def get_database_version(reader):
+    """Return the version of the database opened by `reader`, which is part
+    of shared cache keys so that upgrading the database invalidates them.
+
+    It is derived from the modification time and size of the database files.
+    """
+    if settings.GEOIP_SHARED_CACHE_VERSION is not None:
+        return settings.GEOIP_SHARED_CACHE_VERSION
+
+    if isinstance(reader, IPRangeIndex):
+        return reader.version
+
+    version = versions.get(reader)
+
+    if version is None:
+        stats = []
+
+        for path in get_database_files():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+
+            stats.append(
+                "{}:{}:{}".format(
+                    os.path.basename(path), stat.st_mtime_ns, stat.st_size
+                )
+            )
+
+        if stats:
+            version = "{:08x}".format(zlib.crc32(",".join(stats).encode("utf-8")))
+        else:
+            logger.warning(
+                "GeoIP database files not found, shared cache keys will not "
+                "change when the database is upgraded"
+            )
+
+            version = 0
+
+        versions[reader] = version
+
+    return version
+
+
+def get_shared_cache_key(key, version):
+    method, network = key
+
+    return "metasettings:geoip:{}:{}:{}".format(version, method, network)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Return the thread pool running blocking lookups of async callers."""
+    global _executor
+
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.GEOIP_EXECUTOR_WORKERS,
+                    thread_name_prefix="metasettings-geoip",
+                )
+
+    return _executor
+
+
+async def alookup(method, ip_address):
+    """Asynchronous `lookup`, cached results are returned right away while
+    database queries run in the bounded executor.
+    """
+    key = get_cache_key(method, ip_address)
+
+    if key is None:
+        return None
+
+    result = resolutions.get(key, _missing)
+
+    if result is not _missing:
+        return result
+
+    loop = asyncio.get_running_loop()
+
+    return await loop.run_in_executor(get_executor(), resolve, key, method, ip_address)
+
+
+def query_many(method, ip_addresses):
+    try:
+        reader = get_reader()
+    except Exception as e:
+        logger.warning(e)
+
+        return [None] * len(ip_addresses)
+
+    return [query(reader, method, ip_address) for ip_address in ip_addresses]
+
+
+def get_worker_settings():
+    """Return the settings needed by worker processes to open the database.
+
+    They are handed over explicitly as workers started with "spawn" or
+    "forkserver" inherit nothing from the parent process.
+    """
+    from django.conf import settings as django_settings
+
+    options = dict(
+        (name, getattr(django_settings, name))
+        for name in ("GEOIP_PATH", "GEOIP_CITY", "GEOIP_COUNTRY")
+        if hasattr(django_settings, name)
+    )
+
+    options.update(
+        METASETTINGS_GEOIP_MODE=settings.GEOIP_MODE,
+        METASETTINGS_IP_INDEX_PATH=settings.IP_INDEX_PATH,
+    )
+
+    return options
+
+
+def lookup_many(method, ip_addresses, processes=None, chunk_size=10000):
+    """Yield the result of `method` for each of `ip_addresses`, in order.
+
+    The input is consumed by chunks of `chunk_size` addresses and each
+    distinct network of a chunk is looked up once, in a pool of `processes`
+    worker processes when given. Results are not stored in the in-process
+    resolution cache, the shared cache is read and written by chunks.
+    """
+    shared_cache = get_shared_cache()
+
+    if shared_cache is not None:
+        version = get_database_version(get_reader())
+
+    if processes:
+        from .workers import initialize
+
+        executor = ProcessPoolExecutor(
+            processes, initializer=initialize, initargs=(get_worker_settings(),)
+        )
+    else:
+        executor = None
+
+    try:
+        for chunk in batches(ip_addresses, chunk_size):
+            keys = [get_cache_key(method, ip_address) for ip_address in chunk]
+
+            # Only the results of the current chunk are kept in memory
+            results = {}
+
+            pending = OrderedDict()
+
+            for key, ip_address in zip(keys, chunk):
+                if key is not None and key not in pending:
+                    pending[key] = ip_address
+
+            if pending and shared_cache is not None:
+                shared_keys = dict(
+                    (get_shared_cache_key(key, version), key) for key in pending
+                )
+
+                try:
+                    cached = shared_cache.get_many(shared_keys)
+                except Exception as e:
+                    logger.warning(e)
+
+                    cached = {}
+
+                for shared_key, value in cached.items():
+                    key = shared_keys[shared_key]
+
+                    results[key] = value
+
+                    del pending[key]
+
+            if pending:
+                if executor is None:
+                    values = query_many(method, list(pending.values()))
+                else:
+                    values = []
+
+                    parts = batches(pending.values(), max(1, len(pending) // processes))
+
+                    for part in executor.map(query_many, repeat(method), parts):
+                        values.extend(part)
+
+                results.update(zip(pending, values))
+
+                if shared_cache is not None:
+                    try:
+                        shared_cache.set_many(
+                            dict(
+                                (get_shared_cache_key(key, version), value)
+                                for key, value in zip(pending, values)
+                            ),
+                            settings.GEOIP_SHARED_CACHE_TTL,
+                        )
+                    except Exception as e:
+                        logger.warning(e)
+
+            for key in keys:
+                yield results[key] if key is not None else None
+    finally:
+        if executor is not None:
+            executor.shutdown()
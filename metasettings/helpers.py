@@ -1,3 +1,6 @@
+import ipaddress
+
+
 def get_client_ip(request):
     x_forwarded_for = request.META.get("HTTP_X_FORWARDED_FOR")
     if x_forwarded_for:
@@ -10,3 +13,45 @@ def get_client_ip(request):
         ip = request.META.get("REMOTE_ADDR")
 
     return ip
+
+
+def parse_ip(ip_address):
+    """Return the `ipaddress` object of `ip_address`, IPv4-mapped IPv6
+    addresses (::ffff:78.192.244.8, from dual-stack proxies) being converted
+    to the IPv4 address they map to.
+    """
+    ip = ipaddress.ip_address(ip_address)
+
+    if ip.version == 6 and ip.ipv4_mapped is not None:
+        return ip.ipv4_mapped
+
+    return ip
+
+
+def is_public_ip(ip_address):
+    """Return False for private, loopback, link-local and reserved addresses."""
+    try:
+        ip = parse_ip(ip_address)
+    except ValueError:
+        return True
+
+    return ip.is_global
+
+
+def get_network_key(ip_address, ipv4_prefix=32, ipv6_prefix=128):
+    """Return the network `ip_address` belongs to, as a string.
+
+    Addresses which cannot be parsed (hostnames for instance) are returned
+    untouched.
+    """
+    try:
+        ip = parse_ip(ip_address)
+    except ValueError:
+        return ip_address
+
+    prefix = ipv4_prefix if ip.version == 4 else ipv6_prefix
+
+    if prefix >= ip.max_prefixlen:
+        return str(ip)
+
+    return str(ipaddress.ip_network((ip, prefix), strict=False))
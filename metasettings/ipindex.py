@@ -0,0 +1,229 @@
+import csv
+import ipaddress
+import mmap
+import os
+import struct
+import tempfile
+import zlib
+
+from bisect import bisect_right
+
+from .exceptions import InvalidIPIndex
+from .helpers import parse_ip
+
+
+MAGIC = b"MSIP"
+
+VERSION = 1
+
+# magic, version, IPv4 ranges count, IPv6 ranges count
+HEADER = struct.Struct(">4sBxxxII")
+
+COUNTRY_WIDTH = 2
+
+
+class Column(object):
+    """Read-only sequence of fixed-width items stored in `buffer`.
+
+    Addresses are stored big-endian so comparing items as bytes is the same
+    as comparing them as integers, which lets `bisect` work directly on a
+    memory map without decoding it.
+    """
+
+    def __init__(self, buffer, offset, width, length):
+        self.buffer = buffer
+        self.offset = offset
+        self.width = width
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        if not 0 <= index < self.length:
+            raise IndexError(index)
+
+        start = self.offset + index * self.width
+
+        return self.buffer[start : start + self.width]
+
+
+class Ranges(object):
+    def __init__(self, buffer, offset, width, length):
+        self.starts = Column(buffer, offset, width, length)
+        offset += width * length
+
+        self.ends = Column(buffer, offset, width, length)
+        offset += width * length
+
+        self.countries = Column(buffer, offset, COUNTRY_WIDTH, length)
+
+        self.size = (width * 2 + COUNTRY_WIDTH) * length
+
+    def find(self, key):
+        index = bisect_right(self.starts, key) - 1
+
+        if index >= 0 and key <= self.ends[index]:
+            return self.countries[index].decode("ascii")
+
+        return None
+
+
+class IPRangeIndex(object):
+    """Country resolver backed by sorted IP ranges, without native dependency.
+
+    The binary format is a header followed, for IPv4 then IPv6, by the
+    sorted range starts, the range ends and the two letters country codes.
+    """
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self._version = None
+
+        try:
+            magic, version, ipv4_count, ipv6_count = HEADER.unpack_from(buffer, 0)
+        except struct.error:
+            raise InvalidIPIndex("Invalid IP index: truncated header")
+
+        if magic != MAGIC or version != VERSION:
+            raise InvalidIPIndex("Invalid IP index: unknown format")
+
+        self.ipv4 = Ranges(buffer, HEADER.size, 4, ipv4_count)
+        self.ipv6 = Ranges(buffer, HEADER.size + self.ipv4.size, 16, ipv6_count)
+
+        if len(buffer) < HEADER.size + self.ipv4.size + self.ipv6.size:
+            raise InvalidIPIndex("Invalid IP index: truncated data")
+
+    @classmethod
+    def open(cls, path, memory=False):
+        """Open the index stored at `path`, memory-mapped unless `memory`."""
+        with open(path, "rb") as f:
+            if memory:
+                return cls(f.read())
+
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    @classmethod
+    def from_ranges(cls, ranges):
+        return cls(build(ranges))
+
+    def country_code(self, ip_address):
+        ip = parse_ip(ip_address)
+
+        if ip.version == 4:
+            return self.ipv4.find(ip.packed)
+
+        return self.ipv6.find(ip.packed)
+
+    @property
+    def version(self):
+        """Checksum of the index, computed once."""
+        if self._version is None:
+            self._version = "{:08x}".format(zlib.crc32(self.buffer))
+
+        return self._version
+
+    def close(self):
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+
+    def __len__(self):
+        return len(self.ipv4.starts) + len(self.ipv6.starts)
+
+
+def parse_address(value):
+    value = value.strip()
+
+    if value.isdigit():
+        return ipaddress.ip_address(int(value))
+
+    return ipaddress.ip_address(value)
+
+
+def parse_row(row):
+    """Return a `(start, end, country_code)` tuple from a CSV row, which is
+    either `network,country_code` or `start,end,country_code`.
+    """
+    if len(row) == 2:
+        network = ipaddress.ip_network(row[0].strip(), strict=False)
+
+        return network[0], network[-1], row[1].strip().upper()
+
+    return parse_address(row[0]), parse_address(row[1]), row[2].strip().upper()
+
+
+def read_csv(f):
+    """Yield `(start, end, country_code)` tuples from a CSV export, the
+    header and rows without country are skipped.
+    """
+    for i, row in enumerate(csv.reader(f)):
+        if not row or row[0].startswith("#"):
+            continue
+
+        try:
+            start, end, country_code = parse_row(row)
+        except (ValueError, IndexError):
+            if i == 0:
+                continue
+
+            raise InvalidIPIndex("Invalid row {}: {}".format(i + 1, ",".join(row)))
+
+        if len(country_code) != COUNTRY_WIDTH:
+            continue
+
+        yield start, end, country_code
+
+
+def build(ranges):
+    """Serialize `(start, end, country_code)` tuples to the index format."""
+    families = {4: [], 6: []}
+
+    for start, end, country_code in ranges:
+        if start.version != end.version:
+            raise InvalidIPIndex(
+                "Mixed IP versions in range {} - {}".format(start, end)
+            )
+
+        families[start.version].append(
+            (start.packed, end.packed, country_code.encode("ascii"))
+        )
+
+    chunks = [HEADER.pack(MAGIC, VERSION, len(families[4]), len(families[6]))]
+
+    for version in (4, 6):
+        rows = sorted(families[version])
+
+        for previous, current in zip(rows, rows[1:]):
+            if current[0] <= previous[1]:
+                raise InvalidIPIndex(
+                    "Overlapping ranges starting at {} and {}".format(
+                        ipaddress.ip_address(previous[0]),
+                        ipaddress.ip_address(current[0]),
+                    )
+                )
+
+        chunks.extend(row[0] for row in rows)
+        chunks.extend(row[1] for row in rows)
+        chunks.extend(row[2] for row in rows)
+
+    return b"".join(chunks)
+
+
+def write(ranges, path):
+    """Build the index from `ranges` and atomically replace `path` with it."""
+    data = build(ranges)
+
+    directory = os.path.dirname(os.path.abspath(path))
+
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".ipindex")
+
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+
+        os.replace(tmp_path, path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+
+    return len(data)
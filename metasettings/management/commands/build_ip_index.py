@@ -0,0 +1,42 @@
+import io
+
+from django.core.management.base import BaseCommand, CommandError
+
+from metasettings import settings
+from metasettings.exceptions import InvalidIPIndex
+from metasettings.ipindex import read_csv, write
+
+
+class Command(BaseCommand):
+    help = "Build the IP range index used to resolve countries from a CSV export"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "csv_path",
+            help="CSV file of network,country_code or start,end,country_code rows",
+        ),
+
+        parser.add_argument(
+            "--output",
+            dest="output",
+            default=None,
+            help="The index path, METASETTINGS_IP_INDEX_PATH by default",
+        ),
+
+    def handle(self, *args, **options):
+        output = options.get("output") or settings.IP_INDEX_PATH
+
+        if not output:
+            raise CommandError("The output path is required")
+
+        try:
+            with io.open(options["csv_path"], encoding="utf-8", newline="") as f:
+                ranges = list(read_csv(f))
+
+            size = write(ranges, output)
+        except (IOError, InvalidIPIndex) as e:
+            raise CommandError(e)
+
+        self.stdout.write(
+            "Wrote {} ranges ({} bytes) to {}".format(len(ranges), size, output)
+        )
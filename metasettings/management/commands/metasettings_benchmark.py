@@ -0,0 +1,98 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from metasettings.benchmarks import BENCHMARKS, compare, dumps, run
+
+
+class Command(BaseCommand):
+    help = "Time metasettings hot paths and compare them with a baseline"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "benchmarks",
+            nargs="*",
+            help="Benchmarks to run among: {}".format(
+                ", ".join(name for name, setup in BENCHMARKS)
+            ),
+        ),
+
+        parser.add_argument(
+            "--number",
+            dest="number",
+            type=int,
+            default=None,
+            help="The number of calls per timing, calibrated by default",
+        ),
+
+        parser.add_argument(
+            "--repeat",
+            dest="repeat",
+            type=int,
+            default=5,
+            help="The number of timings of each benchmark",
+        ),
+
+        parser.add_argument(
+            "--output",
+            dest="output",
+            default=None,
+            help="The JSON file to write results to, stdout by default",
+        ),
+
+        parser.add_argument(
+            "--baseline",
+            dest="baseline",
+            default=None,
+            help="The JSON results of a previous run to compare with",
+        ),
+
+        parser.add_argument(
+            "--threshold",
+            dest="threshold",
+            type=float,
+            default=0.2,
+            help="The slowdown ratio reported as a regression",
+        ),
+
+    def handle(self, *args, **options):
+        names = options.get("benchmarks") or None
+
+        if names:
+            unknown = set(names) - set(name for name, setup in BENCHMARKS)
+
+            if unknown:
+                raise CommandError(
+                    "Unknown benchmarks: {}".format(", ".join(sorted(unknown)))
+                )
+
+        baseline = None
+
+        if options.get("baseline"):
+            try:
+                with open(options["baseline"]) as f:
+                    baseline = json.load(f)
+            except (IOError, ValueError) as e:
+                raise CommandError(e)
+
+        results = run(names, number=options.get("number"), repeat=options["repeat"])
+
+        if baseline is not None:
+            results["comparison"] = compare(
+                results, baseline, threshold=options["threshold"]
+            )
+
+        if options.get("output"):
+            with open(options["output"], "w") as f:
+                f.write(dumps(results))
+        else:
+            self.stdout.write(dumps(results))
+
+        regressions = sorted(
+            name
+            for name, comparison in results.get("comparison", {}).items()
+            if comparison["status"] == "regression"
+        )
+
+        if regressions:
+            raise CommandError("Regressions: {}".format(", ".join(regressions)))
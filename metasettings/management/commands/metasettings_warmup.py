@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from metasettings.warmup import STEPS, warmup
+
+
+class Command(BaseCommand):
+    help = "Build metasettings lazily initialised structures and time each step"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "steps",
+            nargs="*",
+            help="Steps to run among: {}".format(
+                ", ".join(name for name, func in STEPS)
+            ),
+        ),
+
+    def handle(self, *args, **options):
+        steps = options.get("steps") or None
+
+        if steps:
+            unknown = set(steps) - set(name for name, func in STEPS)
+
+            if unknown:
+                raise CommandError(
+                    "Unknown steps: {}".format(", ".join(sorted(unknown)))
+                )
+
+        for name, duration, error in warmup(steps):
+            line = "{}: {:.2f}ms".format(name, duration * 1000)
+
+            if error is not None:
+                self.stderr.write("{} ({})".format(line, error))
+            else:
+                self.stdout.write(line)
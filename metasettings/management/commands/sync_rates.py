@@ -1,10 +1,9 @@
 from datetime import date, datetime
 from dateutil.relativedelta import relativedelta
 
-from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
 
-from metasettings.openexchangerates import sync_rates
+from metasettings.providers import get_provider, sync, sync_many
 
 
 class Command(BaseCommand):
@@ -13,6 +12,20 @@ class Command(BaseCommand):
             "--app_id", dest="app_id", default=None, help="The openexchangerates APP ID"
         ),
 
+        parser.add_argument(
+            "--provider",
+            dest="provider",
+            default=None,
+            help="The dotted path of the rates provider class",
+        ),
+
+        parser.add_argument(
+            "--path",
+            dest="path",
+            default=None,
+            help="The file read by the file provider",
+        ),
+
         parser.add_argument(
             "--date_start",
             dest="date_start",
@@ -27,19 +40,49 @@ class Command(BaseCommand):
             help="The date end to import currency rates",
         ),
 
+        parser.add_argument(
+            "--daily",
+            dest="daily",
+            action="store_true",
+            default=False,
+            help="Import the currency rates of each day instead of each month",
+        ),
+
+        parser.add_argument(
+            "--workers",
+            dest="workers",
+            type=int,
+            default=None,
+            help="The number of months fetched concurrently",
+        ),
+
+        parser.add_argument(
+            "--rate_limit",
+            dest="rate_limit",
+            type=float,
+            default=None,
+            help="The maximum number of requests per second",
+        ),
+
     def handle(self, *args, **options):
-        app_id = options.get(
-            "app_id", getattr(settings, "OPENEXCHANGERATES_APP_ID", None)
+        provider_options = dict(
+            (name, options[name])
+            for name in ("app_id", "path", "workers", "rate_limit")
+            if options.get(name) is not None
         )
 
-        if not app_id:
-            raise CommandError("The openexchangerates APP ID is required")
+        try:
+            provider = get_provider(options.get("provider"), **provider_options)
+        except (ImportError, TypeError, ValueError) as e:
+            raise CommandError(e)
 
         start = options.get("date_start")
         end = options.get("date_end")
 
         if start is None and end is None:
-            return sync_rates(app_id)
+            sync(provider)
+
+            return
 
         if start:
             start = datetime.strptime(options.get("date_start"), "%Y-%m-%d").date()
@@ -51,12 +94,33 @@ class Command(BaseCommand):
         else:
             end = date.today()
 
-        date_start = date(start.year, start.month, 1)
-        date_end = date(end.year, end.month, 1)
+        daily = options.get("daily")
+
+        if daily:
+            step, label = relativedelta(days=1), "{:%Y-%m-%d}"
+        else:
+            start = date(start.year, start.month, 1)
+            end = date(end.year, end.month, 1)
+
+            step, label = relativedelta(months=1), "{:%Y-%m}"
+
+        dates = []
+
+        current = start
 
-        if date_start and date_end:
-            current = date_start
+        while end >= current:
+            dates.append(current)
+            current = current + step
 
-            while date_end >= current:
-                sync_rates(app_id, current)
-                current = current + relativedelta(months=1)
+        for current, results in sync_many(provider, dates, daily=daily):
+            if results is None:
+                self.stderr.write("{}: failed".format(label.format(current)))
+            else:
+                self.stdout.write(
+                    "{}: {} created, {} updated, {} unchanged".format(
+                        label.format(current),
+                        len(results["created"]),
+                        len(results["updated"]),
+                        len(results["unchanged"]),
+                    )
+                )
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from metasettings import settings
+from metasettings.models import CurrencyRate
+
+
+class Command(BaseCommand):
+    help = "Write the binary snapshot of currency rates shared by workers"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output",
+            dest="output",
+            default=None,
+            help="The snapshot path, METASETTINGS_RATES_SNAPSHOT_PATH by default",
+        ),
+
+        parser.add_argument(
+            "--alias",
+            dest="alias",
+            default=None,
+            help="The cache to publish the snapshot to, "
+            "METASETTINGS_RATES_SHARED_CACHE_ALIAS by default",
+        ),
+
+    def handle(self, *args, **options):
+        output = options.get("output") or settings.RATES_SNAPSHOT_PATH
+        alias = options.get("alias") or settings.RATES_SHARED_CACHE_ALIAS
+
+        if not output and not alias:
+            raise CommandError("The output path or the cache alias is required")
+
+        if output:
+            try:
+                generation = CurrencyRate.objects.write_snapshot(output)
+            except IOError as e:
+                raise CommandError(e)
+
+            self.stdout.write("Wrote generation {} to {}".format(generation, output))
+
+        if alias:
+            generation = CurrencyRate.objects.publish_snapshot(alias)
+
+            self.stdout.write(
+                "Published generation {} to the {} cache".format(generation, alias)
+            )
@@ -0,0 +1,86 @@
+import re
+
+from django.utils import translation
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.functional import cached_property
+
+from . import settings
+from .models import CurrencyRate, Location
+
+
+class RequestMetasettings(object):
+    """Metasettings of a request, each of them is computed on first access
+    and then reused.
+    """
+
+    def __init__(self, request, geoip=True):
+        self.request = request
+        self.geoip = geoip
+
+    @cached_property
+    def location(self):
+        return Location.from_request(self.request, geoip=self.geoip)
+
+    async def alocation(self):
+        if "location" not in self.__dict__:
+            location = await Location.afrom_request(self.request, geoip=self.geoip)
+
+            self.__dict__.setdefault("location", location)
+
+        return self.location
+
+    @property
+    def currency(self):
+        return self.location.currency
+
+    @property
+    def timezone(self):
+        return self.location.timezone
+
+    @cached_property
+    def rates(self):
+        """Rate table pinned for the whole request."""
+        return CurrencyRate.objects.get_rate_table()
+
+    @cached_property
+    def language(self):
+        return translation.get_language_from_request(self.request)
+
+
+class MetasettingsMiddleware(MiddlewareMixin):
+    """Attach a lazy `request.metasettings` to every request.
+
+    Requests matching `METASETTINGS_MIDDLEWARE_SKIP_PATHS` or
+    `METASETTINGS_MIDDLEWARE_SKIP_USER_AGENTS` never trigger a GeoIP lookup,
+    they only get values from cookies or defaults.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(MetasettingsMiddleware, self).__init__(*args, **kwargs)
+
+        self.skip_paths = [re.compile(path) for path in settings.MIDDLEWARE_SKIP_PATHS]
+
+        self.skip_user_agents = None
+
+        if settings.MIDDLEWARE_SKIP_USER_AGENTS:
+            self.skip_user_agents = re.compile(
+                settings.MIDDLEWARE_SKIP_USER_AGENTS, re.IGNORECASE
+            )
+
+    def should_skip(self, request):
+        for path in self.skip_paths:
+            if path.match(request.path_info):
+                return True
+
+        if self.skip_user_agents is not None:
+            user_agent = request.META.get("HTTP_USER_AGENT", "")
+
+            if self.skip_user_agents.search(user_agent):
+                return True
+
+        return False
+
+    def process_request(self, request):
+        request.metasettings = RequestMetasettings(
+            request, geoip=not self.should_skip(request)
+        )
@@ -0,0 +1,44 @@
+from django.db import migrations, models
+
+import metasettings.settings
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="CurrencyRate",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "currency",
+                    models.CharField(
+                        choices=metasettings.settings.CURRENCY_LABELS,
+                        max_length=3,
+                        verbose_name="Currency",
+                    ),
+                ),
+                (
+                    "rate",
+                    models.DecimalField(
+                        decimal_places=2, max_digits=9, verbose_name="Rate"
+                    ),
+                ),
+                ("month", models.PositiveIntegerField(blank=True, null=True)),
+                ("year", models.PositiveIntegerField(blank=True, null=True)),
+                ("date_last_sync", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,14 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("metasettings", "0001_initial")]
+
+    operations = [
+        migrations.AddField(
+            model_name="currencyrate",
+            name="day",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        )
+    ]
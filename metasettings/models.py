@@ -1,19 +1,36 @@
+import datetime
 import logging
 import math
 import decimal
+import sys
+import threading
+
 import pytz
 
 from collections import defaultdict, OrderedDict
 
-from django.utils import translation
+from asgiref.sync import sync_to_async
+
+from django.utils import timezone, translation
 from django.utils.functional import cached_property
 from django.utils.translation import gettext_lazy as _
 from django.utils.encoding import force_str as force_str
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 
 from . import settings, exceptions
+from .cache import LRUCache
+from .geoip import alookup, locate, lookup, lookup_many
 from .helpers import get_client_ip
-from .timezone import time_zone_by_country_and_region
+from .rates import RateIndex, RateTable, quantize
+from .snapshot import (
+    SharedSnapshot,
+    SnapshotFile,
+    publish as publish_rate_snapshot,
+    write as write_rate_snapshot,
+)
+from .timezone import country_dict as country_timezones
 
 
 logger = logging.getLogger("django.metasettings")
@@ -50,7 +67,7 @@ class Currencies(object):
     def countries(self):
         results = defaultdict(list)
 
-        for country_code, currency_code in self.currency_by_countries:
+        for country_code, currency_code in self.currency_by_countries.items():
             results[currency_code].append(country_code)
 
         return results
@@ -137,21 +154,12 @@ class Currency(BaseObject):
 
     @classmethod
     def from_ip_address(cls, ip_address):
-        code = None
+        return Location.from_ip_address(ip_address).currency
 
-        try:
-            from .compat import GeoIP
-        except ImportError as e:
-            logger.exception(e)
-        else:
-            try:
-                code = GeoIP().country_code(ip_address)
-            except Exception as e:
-                logger.warning(e)
-            else:
-                code = currencies.currency_by_countries.get(code, None)
-
-        return cls(code or settings.DEFAULT_CURRENCY)
+    @classmethod
+    def from_ip_addresses(cls, ip_addresses, processes=None):
+        for location in Location.from_ip_addresses(ip_addresses, processes=processes):
+            yield location.currency
 
     @classmethod
     def from_cookies(cls, request):
@@ -173,6 +181,9 @@ class Currency(BaseObject):
 
 
 def get_currency_from_request(request):
+    if getattr(request, "metasettings", None) is not None:
+        return request.metasettings.currency
+
     return Currency.from_request(request)
 
 
@@ -185,57 +196,544 @@ def get_currency_from_ip_address(ip_address):
 
 
 def get_language_from_request(request):
+    if getattr(request, "metasettings", None) is not None:
+        return request.metasettings.language
+
     return translation.get_language_from_request(request)
 
 
 def convert_amount(
-    from_currency, to_currency, amount, ceil=False, year=None, month=None
+    from_currency,
+    to_currency,
+    amount,
+    ceil=False,
+    year=None,
+    month=None,
+    rates=None,
+    at=None,
 ):
+    """Convert `amount` from `from_currency` to `to_currency` with the rates
+    of the given period, the rates in effect on the date `at`, or with `rates`
+    when a `RateTable` is given.
+
+    The result is rounded up to an integer when `ceil` is set, rounded by
+    `metasettings.rates.quantize` otherwise.
+    """
     if from_currency == to_currency:
         return amount
 
-    currency_rates = CurrencyRate.objects.get_currency_rates(year=year, month=month)
+    if rates is None:
+        if at is not None:
+            rates = CurrencyRate.objects.get_rates_at(at)
+        else:
+            rates = CurrencyRate.objects.get_currency_rates(year=year, month=month)
 
-    result = (amount / currency_rates[from_currency].rate) * currency_rates[
-        to_currency
-    ].rate
+    if isinstance(rates, RateTable):
+        result = rates.convert(from_currency, to_currency, amount)
+    else:
+        result = (amount / rates[from_currency].rate) * rates[to_currency].rate
 
     if ceil:
-        result = int(math.ceil(result))
+        return int(math.ceil(result))
+
+    return quantize(result)
+
+
+def convert_amounts(
+    from_currencies,
+    to_currency,
+    amounts,
+    ceil=False,
+    year=None,
+    month=None,
+    rates=None,
+    at=None,
+):
+    """Convert each of `amounts` to `to_currency`, `from_currencies` being a
+    currency or a sequence of currencies of the same length as `amounts`.
+
+    Amounts are grouped by source currency so each conversion factor is
+    retrieved once. Results are the same as `convert_amount` ones, in input
+    order. NumPy arrays of amounts are converted with floats instead, see
+    `RateTable.convert_array`.
 
-    return result
+    `at` is a date or a sequence of dates of the same length as `amounts`,
+    amounts being then grouped by rates in effect on their date.
+    """
+    # NumPy is only imported by callers passing arrays, it is not worth
+    # importing here just to find out amounts are not one.
+    numpy = sys.modules.get("numpy")
+    is_array = numpy is not None and isinstance(amounts, numpy.ndarray)
+
+    if isinstance(from_currencies, (str, BaseObject)):
+        from_currencies = force_str(from_currencies)
+
+    if rates is None and at is not None and not isinstance(at, datetime.date):
+
+        if not is_array:
+            amounts = list(amounts)
+
+        if not isinstance(from_currencies, str):
+            from_currencies = list(from_currencies)
+
+        tables, groups = {}, defaultdict(list)
+
+        for i, date in enumerate(at):
+            if date not in tables:
+                tables[date] = CurrencyRate.objects.get_rates_at(date)
+
+            groups[id(tables[date])].append(i)
+
+        tables = dict((id(table), table) for table in tables.values())
+
+        results = numpy.empty(len(amounts)) if is_array else [None] * len(amounts)
+
+        for key, indexes in groups.items():
+            if isinstance(from_currencies, str):
+                currencies = from_currencies
+            else:
+                currencies = [from_currencies[i] for i in indexes]
+
+            if is_array:
+                results[indexes] = convert_amounts(
+                    currencies
+                    if isinstance(currencies, str)
+                    else numpy.asarray(currencies),
+                    to_currency,
+                    amounts[indexes],
+                    ceil=ceil,
+                    rates=tables[key],
+                )
+            else:
+                values = convert_amounts(
+                    currencies,
+                    to_currency,
+                    [amounts[i] for i in indexes],
+                    ceil=ceil,
+                    rates=tables[key],
+                )
+
+                for i, value in zip(indexes, values):
+                    results[i] = value
+
+        return results
+
+    if rates is None:
+        if at is not None:
+            rates = CurrencyRate.objects.get_rates_at(at)
+        else:
+            rates = CurrencyRate.objects.get_currency_rates(year=year, month=month)
+
+    if is_array:
+        if not isinstance(rates, RateTable):
+            rates = RateTable(rates)
+
+        return rates.convert_array(from_currencies, to_currency, amounts, ceil=ceil)
+
+    amounts = list(amounts)
+
+    if isinstance(from_currencies, str):
+        groups = {from_currencies: range(len(amounts))}
+    else:
+        groups = defaultdict(list)
+
+        for i, from_currency in enumerate(from_currencies):
+            groups[from_currency].append(i)
+
+    results = list(amounts)
+
+    for from_currency, indexes in groups.items():
+        if from_currency == to_currency:
+            continue
+
+        if isinstance(rates, RateTable):
+            factor = rates.factor(from_currency, to_currency)
+
+            for i in indexes:
+                results[i] = amounts[i] * factor
+        else:
+            for i in indexes:
+                results[i] = (amounts[i] / rates[from_currency].rate) * rates[
+                    to_currency
+                ].rate
+
+        if ceil:
+            for i in indexes:
+                results[i] = int(math.ceil(results[i]))
+        else:
+            for i in indexes:
+                results[i] = quantize(results[i])
+
+    return results
+
+
+async def aconvert_amount(
+    from_currency,
+    to_currency,
+    amount,
+    ceil=False,
+    year=None,
+    month=None,
+    rates=None,
+    at=None,
+):
+    """Asynchronous `convert_amount`, rates are loaded without blocking the
+    event loop.
+    """
+    if from_currency == to_currency:
+        return amount
+
+    if rates is None:
+        if at is not None:
+            rates = await sync_to_async(CurrencyRate.objects.get_rates_at)(at)
+        else:
+            rates = await CurrencyRate.objects.aget_currency_rates(
+                year=year, month=month
+            )
+
+    return convert_amount(from_currency, to_currency, amount, ceil=ceil, rates=rates)
 
 
 class CurrencyRateManager(models.Manager):
     CURRENCY_CHOICES = dict(settings.CURRENCY_CHOICES)
 
+    version = 0
+
+    # Guards the version and the caches of loaded rates together
+    _lock = threading.Lock()
+
+    snapshot_generation = None
+
+    _snapshot_source = None
+
     @cached_property
+    def periods(self):
+        return LRUCache(
+            maxsize=settings.RATES_CACHE_PERIODS, ttl=settings.RATES_CACHE_TTL
+        )
+
+    @cached_property
+    def indexes(self):
+        return LRUCache(
+            maxsize=settings.RATES_CACHE_YEARS, ttl=settings.RATES_CACHE_TTL
+        )
+
+    def load_period(self, year=None, month=None):
+        """Return a `RateTable` of the given period, or of the latest sync
+        when no period is given.
+        """
+        if not (year and month):
+            year = month = None
+
+        snapshot = self.get_snapshot()
+
+        if snapshot is not None:
+            rates = snapshot.get_rates(year, month) or {}
+
+            return RateTable(
+                (
+                    (
+                        currency,
+                        self.model(
+                            currency=currency, rate=rate, year=year, month=month
+                        ),
+                    )
+                    for currency, rate in rates.items()
+                ),
+                year=year,
+                month=month,
+            )
+
+        if year and month:
+            queryset = self.filter(year=year, month=month, day__isnull=True)
+        else:
+            queryset = self.filter(year__isnull=True, month__isnull=True)
+
+        return RateTable(
+            ((currency_rate.currency, currency_rate) for currency_rate in queryset),
+            year=year,
+            month=month,
+        )
+
+    def get_period(self, year=None, month=None):
+        """Return rates of the given period, loaded on first access and then
+        kept in a bounded cache of recently used periods.
+        """
+        key = (year, month) if year and month else (None, None)
+
+        self.get_snapshot()
+
+        rates = self.periods.get(key)
+
+        if rates is None:
+            version = self.version
+
+            rates = self.load_period(year, month)
+
+            self.store(self.periods, key, rates, version)
+
+        return rates
+
+    @property
     def rates(self):
-        rates = defaultdict(lambda: defaultdict(lambda: defaultdict(dict)))
+        """Rates of every period, mapped by year then month then currency.
 
-        for currency_rate in self.all():
-            if currency_rate.year and currency_rate.month:
-                rates[currency_rate.year][currency_rate.month][
-                    currency_rate.currency
-                ] = currency_rate
-            else:
-                rates[currency_rate.currency] = currency_rate
+        The whole table is loaded on each access, use `get_currency_rates`
+        to retrieve the rates of a given period.
+        """
+        rates = {}
+
+        for currency_rate in self.filter(
+            year__isnull=False, month__isnull=False, day__isnull=True
+        ):
+            rates.setdefault(currency_rate.year, {}).setdefault(
+                currency_rate.month, {}
+            )[currency_rate.currency] = currency_rate
 
         return rates
 
-    @cached_property
+    @property
     def default_rates(self):
-        return dict(
-            (currency_rate.currency, currency_rate)
-            for currency_rate in self.filter(month__isnull=True, year__isnull=True)
+        return self.get_period()
+
+    def invalidate(self):
+        """Drop loaded rates, they are reloaded on next access."""
+        with self._lock:
+            self.version += 1
+            self.periods.clear()
+            self.indexes.clear()
+
+    def store(self, cache, key, value, version):
+        """Keep `value`, loaded at `version`, in `cache` unless rates were
+        invalidated since.
+        """
+        with self._lock:
+            if version == self.version:
+                cache.set(key, value)
+
+    def load_rate_index(self, year):
+        """Return a `RateIndex` of the monthly and daily rates of `year` and
+        of the most recent rate of each currency before it, with a single
+        query. Monthly rates take effect on the first day of their month and
+        daily rates replace them.
+        """
+        latest = (
+            self.filter(
+                currency=models.OuterRef("currency"),
+                year__lt=year,
+                month__isnull=False,
+            )
+            .order_by(
+                "-year",
+                "-month",
+                models.F("day").desc(nulls_last=True),
+                "-date_last_sync",
+            )
+            .values("pk")[:1]
+        )
+
+        rows = sorted(
+            self.filter(
+                models.Q(year=year, month__isnull=False)
+                | models.Q(year__lt=year, pk=models.Subquery(latest))
+            ).values_list("year", "month", "day", "currency", "rate", "date_last_sync"),
+            key=lambda row: (row[2] is not None, row[5]),
         )
 
+        return RateIndex(
+            (datetime.date(year, month, day or 1), currency, rate)
+            for year, month, day, currency, rate, date_last_sync in rows
+        )
+
+    def get_rate_index(self, year):
+        """Return the index of the rates in effect during `year`, the
+        indexes of the most recently used years being cached.
+        """
+        index = self.indexes.get(year)
+
+        if index is None:
+            version = self.version
+
+            index = self.load_rate_index(year)
+
+            self.store(self.indexes, year, index, version)
+
+        return index
+
+    def get_rates_at(self, date):
+        """Return a `RateTable` of the most recent rate of each currency on
+        or before `date`, currencies without such rate having their default
+        rate.
+
+        Tables are shared by dates with the same rates in effect, looking
+        them up does not query the database once the index is loaded.
+        """
+        index = self.get_rate_index(date.year)
+
+        effective_date = index.effective_date(date)
+
+        if effective_date is None:
+            return self.get_period()
+
+        key = ("at", effective_date)
+
+        rates = self.periods.get(key)
+
+        if rates is None:
+            version = self.version
+
+            currency_rates = dict(self.get_period())
+
+            for currency, rate in index.rates_at(effective_date).items():
+                currency_rates[currency] = self.model(
+                    currency=currency,
+                    rate=rate,
+                    year=effective_date.year,
+                    month=effective_date.month,
+                    day=effective_date.day,
+                )
+
+            rates = RateTable(
+                currency_rates, year=effective_date.year, month=effective_date.month
+            )
+
+            self.store(self.periods, key, rates, version)
+
+        return rates
+
+    def get_snapshot_source(self):
+        if settings.RATES_SNAPSHOT_PATH:
+            key = (SnapshotFile, settings.RATES_SNAPSHOT_PATH)
+        elif settings.RATES_SHARED_CACHE_ALIAS:
+            key = (SharedSnapshot, settings.RATES_SHARED_CACHE_ALIAS)
+        else:
+            return None
+
+        source = self._snapshot_source
+
+        if source is None or source[0] != key:
+            source_class, location = key
+
+            source = self._snapshot_source = (
+                key,
+                source_class(location, settings.RATES_SNAPSHOT_CHECK_INTERVAL),
+            )
+
+        return source[1]
+
+    def get_snapshot(self):
+        """Return the `RateSnapshot` at `METASETTINGS_RATES_SNAPSHOT_PATH`,
+        or published in the `METASETTINGS_RATES_SHARED_CACHE_ALIAS` cache, if
+        any, rates being loaded from it instead of the database.
+
+        Loaded rates are dropped when a new generation is written.
+        """
+        source = self.get_snapshot_source()
+
+        if source is None:
+            return None
+
+        snapshot = source.get()
+
+        generation = snapshot.generation if snapshot is not None else None
+
+        if generation != self.snapshot_generation:
+            self.snapshot_generation = generation
+            self.invalidate()
+
+        return snapshot
+
+    def get_snapshot_periods(self):
+        """Return the rates of every period, daily rates excepted, mapped by
+        `(year, month)` then currency, with a single query.
+        """
+        periods = {}
+
+        queryset = (
+            self.filter(day__isnull=True)
+            .order_by("date_last_sync", "pk")
+            .values_list("year", "month", "currency", "rate")
+        )
+
+        for year, month, currency, rate in queryset:
+            key = (year, month) if year and month else (None, None)
+
+            periods.setdefault(key, {})[currency] = rate
+
+        return periods
+
+    def write_snapshot(self, path=None):
+        """Write the rates of every period to the snapshot at `path`,
+        `METASETTINGS_RATES_SNAPSHOT_PATH` by default, with a single query.
+
+        Returns the generation of the new snapshot.
+        """
+        return write_rate_snapshot(
+            self.get_snapshot_periods(),
+            path or settings.RATES_SNAPSHOT_PATH,
+            places=self.model._meta.get_field("rate").decimal_places,
+        )
+
+    def publish_snapshot(self, alias=None):
+        """Publish the snapshot of the rates of every period in the Django
+        cache `alias`, `METASETTINGS_RATES_SHARED_CACHE_ALIAS` by default.
+
+        Returns the generation of the new snapshot.
+        """
+        return publish_rate_snapshot(
+            self.get_snapshot_periods(),
+            alias or settings.RATES_SHARED_CACHE_ALIAS,
+            timeout=settings.RATES_SHARED_CACHE_TTL,
+            places=self.model._meta.get_field("rate").decimal_places,
+        )
+
+    def share(self):
+        """Write the snapshot and publish it in the shared cache, when they
+        are configured. Called once rates are synced.
+        """
+        if settings.RATES_SNAPSHOT_PATH:
+            self.write_snapshot()
+
+        if settings.RATES_SHARED_CACHE_ALIAS:
+            self.publish_snapshot()
+
+    def get_rate_table(self, year=None, month=None):
+        """Return the `RateTable` used to convert amounts of the given period,
+        which can be pinned for the duration of a request or a job.
+        """
+        return self.get_currency_rates(year=year, month=month)
+
     def get_currency_rates(self, year=None, month=None):
         if year and month:
-            if year in self.rates and month in self.rates[year]:
-                return self.rates[year][month]
+            rates = self.get_period(year, month)
+
+            if rates:
+                return rates
+
+        return self.get_period()
+
+    async def aget_period(self, year=None, month=None):
+        source = self.get_snapshot_source()
 
-        return self.default_rates
+        if source is not None and not source.is_checked():
+            # Checking the snapshot reads a file or the shared cache
+            await sync_to_async(self.get_snapshot)()
+
+        rates = self.periods.get((year, month) if year and month else (None, None))
+
+        if rates is None:
+            rates = await sync_to_async(self.get_period)(year, month)
+
+        return rates
+
+    async def aget_currency_rates(self, year=None, month=None):
+        if year and month:
+            rates = await self.aget_period(year, month)
+
+            if rates:
+                return rates
+
+        return await self.aget_period()
 
     def update_or_create(self, currency, rate, date=None):
         """Update a CurrencyRate object referenced by `currency` (and optionally
@@ -272,6 +770,67 @@ class CurrencyRateManager(models.Manager):
 
             return currency_rate, True
 
+    def sync(self, rates, date=None, daily=False):
+        """Write `rates`, a mapping of currencies to rates, for the month of
+        `date`, for its day when `daily` is set, or as default rates when no
+        date is given.
+
+        Existing rates of the period are read in a single query, then missing
+        ones are created and changed ones updated in bulk, in a transaction.
+        Loaded rates are invalidated once it is committed.
+
+        Returns a dict mapping "created", "updated" and "unchanged" to lists
+        of currencies.
+        """
+        if date:
+            year, month = date.year, date.month
+        else:
+            year = month = None
+
+        day = date.day if date and daily else None
+
+        existing_rates = dict(
+            (currency_rate.currency, currency_rate)
+            for currency_rate in self.filter(year=year, month=month, day=day)
+        )
+
+        results = {"created": [], "updated": [], "unchanged": []}
+
+        created, updated = [], []
+
+        now = timezone.now()
+
+        for currency, rate in rates.items():
+            rate = decimal.Decimal("%.2f" % rate)
+
+            currency_rate = existing_rates.get(currency)
+
+            if currency_rate is None:
+                created.append(
+                    self.model(
+                        currency=currency, rate=rate, year=year, month=month, day=day
+                    )
+                )
+                results["created"].append(currency)
+            elif currency_rate.rate != rate:
+                currency_rate.rate = rate
+                currency_rate.date_last_sync = now
+                updated.append(currency_rate)
+                results["updated"].append(currency)
+            else:
+                results["unchanged"].append(currency)
+
+        if created or updated:
+            with transaction.atomic(using=self.db):
+                self.bulk_create(created)
+                self.bulk_update(updated, ["rate", "date_last_sync"])
+
+                # Run once the outermost transaction commits, callers may
+                # sync within their own transaction
+                transaction.on_commit(self.invalidate, using=self.db)
+
+        return results
+
 
 class CurrencyRate(models.Model):
     currency = models.CharField(
@@ -282,12 +841,20 @@ class CurrencyRate(models.Model):
 
     month = models.PositiveIntegerField(null=True, blank=True)
     year = models.PositiveIntegerField(null=True, blank=True)
+    day = models.PositiveIntegerField(null=True, blank=True)
 
     date_last_sync = models.DateTimeField(auto_now=True)
 
     objects = CurrencyRateManager()
 
 
+@receiver([post_save, post_delete], sender=CurrencyRate)
+def invalidate_currency_rates(sender, using=None, **kwargs):
+    # Invalidating before the commit would let concurrent readers cache the
+    # previous rates again
+    transaction.on_commit(sender.objects.invalidate, using=using)
+
+
 class Money(object):
     __hash__ = None
 
@@ -451,7 +1018,7 @@ class Money(object):
                 "power operator is unsupported between two '{}' "
                 "objects".format(self.__class__.__name__)
             )
-        amount = self.amount ** other
+        amount = self.amount**other
         return self.__class__(amount, self.currency)
 
     def __neg__(self):
@@ -472,12 +1039,16 @@ class Money(object):
     def __round__(self, ndigits=0):
         return self.__class__(round(self.amount, ndigits), self.currency)
 
-    def to(self, currency, ceil=False):
-        """Return equivalent money object in another currency"""
+    def to(self, currency, ceil=False, rates=None, at=None):
+        """Return equivalent money object in another currency, with the rates
+        in effect on the date `at` when given.
+        """
         if currency == self.currency or currency is None:
             return self
 
-        amount = convert_amount(self.currency, currency, self.amount, ceil=ceil)
+        amount = convert_amount(
+            self.currency, currency, self.amount, ceil=ceil, rates=rates, at=at
+        )
 
         return self.__class__(amount, currency)
 
@@ -508,34 +1079,29 @@ timezones = Timezones()
 class Timezone(BaseObject):
     @classmethod
     def from_ip_address(cls, ip_address):
-        if not ip_address:
-            return cls(settings.TIME_ZONE)
-
-        zone = settings.TIME_ZONE
+        return Location.from_ip_address(ip_address).timezone
 
-        try:
-            from .compat import GeoIP
-        except ImportError as e:
-            logger.exception(e)
-        else:
-            try:
-                data = GeoIP().city(ip_address)
-            except Exception as e:
-                logger.warning(e)
-            else:
-                if data:
-                    zone = time_zone_by_country_and_region(
-                        data["country_code"], data["region"] or ""
-                    )
-        return cls(zone)
+    @classmethod
+    def from_ip_addresses(cls, ip_addresses, processes=None):
+        for location in Location.from_ip_addresses(ip_addresses, processes=processes):
+            yield location.timezone
 
     @classmethod
-    def from_request(cls, request):
+    def from_cookies(cls, request):
         zone = request.COOKIES.get(settings.TIMEZONE_COOKIE_NAME, None)
 
         if zone is not None and zone in timezones.timezones:
             return cls(zone)
 
+        return None
+
+    @classmethod
+    def from_request(cls, request):
+        zone = cls.from_cookies(request)
+
+        if zone:
+            return zone
+
         return cls.from_ip_address(get_client_ip(request))
 
     @property
@@ -546,8 +1112,167 @@ class Timezone(BaseObject):
 
 
 def get_timezone_from_request(request):
+    if getattr(request, "metasettings", None) is not None:
+        return request.metasettings.timezone
+
     return Timezone.from_request(request)
 
 
 def get_timezone_from_ip_address(ip_address):
     return Timezone.from_ip_address(ip_address)
+
+
+class Locations(object):
+    @cached_property
+    def bundles(self):
+        """Map each country code to a `(currency code, time zone)` tuple, the
+        time zone being a mapping of region codes to time zones for countries
+        spanning several of them.
+        """
+        currency_by_countries = currencies.currency_by_countries
+
+        return dict(
+            (
+                country_code,
+                (
+                    currency_by_countries.get(country_code),
+                    country_timezones.get(country_code),
+                ),
+            )
+            for country_code in set(currency_by_countries) | set(country_timezones)
+        )
+
+    def get_bundle(self, country_code):
+        return self.bundles.get(country_code) or (None, None)
+
+
+locations = Locations()
+
+
+class Location(object):
+    """Currency and time zone of a visitor, resolved from a single GeoIP
+    query.
+    """
+
+    def __init__(self, country_code=None, region_code=None, found=True):
+        self.country_code = country_code
+        self.region_code = region_code
+
+        currency, zone = locations.get_bundle(country_code)
+
+        if not found:
+            zone = settings.TIME_ZONE
+        elif zone is not None and not isinstance(zone, str):
+            # Without region level data, as with a country database, use the
+            # default time zone rather than none.
+            zone = zone.get(region_code or "") or settings.TIME_ZONE
+
+        self.currency = Currency(currency or settings.DEFAULT_CURRENCY)
+        self.timezone = Timezone(zone)
+
+    def __repr__(self):
+        return "Location(country_code={0}, currency={1}, timezone={2})".format(
+            repr(self.country_code), repr(self.currency.code), repr(self.timezone.code)
+        )
+
+    @classmethod
+    def from_data(cls, data):
+        if not data:
+            return cls(found=False)
+
+        return cls(*data)
+
+    @classmethod
+    def from_ip_address(cls, ip_address):
+        data = None
+
+        try:
+            data = lookup(locate, ip_address)
+        except ImportError as e:
+            logger.exception(e)
+        except Exception as e:
+            logger.warning(e)
+
+        return cls.from_data(data)
+
+    @classmethod
+    async def afrom_ip_address(cls, ip_address):
+        data = None
+
+        try:
+            data = await alookup(locate, ip_address)
+        except ImportError as e:
+            logger.exception(e)
+        except Exception as e:
+            logger.warning(e)
+
+        return cls.from_data(data)
+
+    @classmethod
+    def from_ip_addresses(cls, ip_addresses, processes=None):
+        """Yield a location for each of `ip_addresses`, in order, looking up
+        each distinct address once. Use `processes` to spread lookups over a
+        pool of worker processes.
+        """
+        for data in lookup_many(locate, ip_addresses, processes=processes):
+            # Locations are mutable, never share them between addresses
+            yield cls.from_data(data)
+
+    @classmethod
+    def from_request(cls, request, geoip=True):
+        currency = Currency.from_cookies(request)
+        zone = Timezone.from_cookies(request)
+
+        if not geoip or (currency and zone):
+            location = cls(found=False)
+        else:
+            location = cls.from_ip_address(get_client_ip(request))
+
+        return location.with_preferences(currency, zone)
+
+    @classmethod
+    async def afrom_request(cls, request, geoip=True):
+        currency = Currency.from_cookies(request)
+        zone = Timezone.from_cookies(request)
+
+        if not geoip or (currency and zone):
+            location = cls(found=False)
+        else:
+            location = await cls.afrom_ip_address(get_client_ip(request))
+
+        return location.with_preferences(currency, zone)
+
+    def with_preferences(self, currency=None, zone=None):
+        if currency:
+            self.currency = currency
+
+        if zone:
+            self.timezone = zone
+
+        return self
+
+
+def get_location_from_request(request):
+    if getattr(request, "metasettings", None) is not None:
+        return request.metasettings.location
+
+    return Location.from_request(request)
+
+
+def get_location_from_ip_address(ip_address):
+    return Location.from_ip_address(ip_address)
+
+
+async def aget_location_from_request(request):
+    if getattr(request, "metasettings", None) is not None:
+        return await request.metasettings.alocation()
+
+    return await Location.afrom_request(request)
+
+
+async def aget_currency_from_request(request):
+    return (await aget_location_from_request(request)).currency
+
+
+async def aget_timezone_from_request(request):
+    return (await aget_location_from_request(request)).timezone
@@ -1,41 +1,235 @@
-import json
+import datetime
 import requests
 import logging
+import threading
 
-from .models import CurrencyRate
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings as django_settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from . import settings
+from .providers import BaseProvider, sync, sync_many
+from .store import PayloadStore
+from .util import RateLimiter
 
 LOGGER = logging.getLogger(__name__)
 
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(pool_size=None):
+    """Return the HTTP session shared by the requests of the process running
+    at most `pool_size` at once, which keeps connections alive and retries
+    failed requests with backoff.
+    """
+    pool_size = pool_size or settings.RATES_SYNC_WORKERS
+    session = _sessions.get(pool_size)
+
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.get(pool_size)
+
+            if session is None:
+                adapter = HTTPAdapter(
+                    pool_maxsize=pool_size,
+                    max_retries=Retry(
+                        total=settings.OPENEXCHANGERATES_RETRIES,
+                        backoff_factor=settings.OPENEXCHANGERATES_BACKOFF,
+                        status_forcelist=(429, 500, 502, 503, 504),
+                        allowed_methods=("GET",),
+                        raise_on_status=False,
+                    ),
+                )
+
+                session = requests.Session()
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+
+                _sessions[pool_size] = session
+
+    return session
+
+
+def get_validators_cache():
+    """Return the cache of the validators of the latest rates, if configured."""
+    if not settings.OPENEXCHANGERATES_CACHE_ALIAS:
+        return None
+
+    from django.core.cache import caches
+
+    return caches[settings.OPENEXCHANGERATES_CACHE_ALIAS]
+
 
-def rate_request(app_id, date=None):
-    url = "http://openexchangerates.org/api"
+def get_validators_key(url):
+    return "metasettings:openexchangerates:validators:{}".format(url)
+
+
+def get_store():
+    """Return the store of historical rates payloads, if configured."""
+    if not settings.OPENEXCHANGERATES_STORE_PATH:
+        return None
+
+    return PayloadStore(settings.OPENEXCHANGERATES_STORE_PATH)
+
+
+def rate_request(app_id, date=None, session=None):
+    """Return the rates of `date`, or the latest ones, requested with
+    `session` or the default shared one.
+
+    Historical rates of past days are read from and written to the payload
+    store when configured, so they are downloaded once. When a validators cache
+    is configured, the latest rates are requested with the `ETag` and
+    `Last-Modified` validators of the previous response, None is returned
+    when they have not been modified since.
+    """
+    url = settings.OPENEXCHANGERATES_URL
     if date:
         url += "/historical/%s.json" % date.strftime("%Y-%m-%d")
     else:
         url += "/latest.json"
 
-    response = requests.get(url, params={"app_id": app_id})
+    store = get_store() if date else None
+
+    if store is not None:
+        result = store.get("historical", date)
+
+        if result is not None:
+            return result
+
+    headers = {}
+    cache = get_validators_cache() if not date else None
+
+    if cache is not None:
+        validators = cache.get(get_validators_key(url))
+
+        if validators:
+            etag, last_modified = validators
+
+            if etag:
+                headers["If-None-Match"] = etag
+
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+
+    response = (session or get_session()).get(
+        url,
+        params={"app_id": app_id},
+        headers=headers,
+        timeout=settings.OPENEXCHANGERATES_TIMEOUT,
+    )
+
+    if response.status_code == 304:
+        LOGGER.info("Rates of %s have not been modified", url)
+
+        return None
 
     if response.status_code == 200:
-        return json.loads(response.content)
+        result = response.json()
+
+        if not isinstance(result, dict) or not isinstance(result.get("rates"), dict):
+            # Neither stored nor validated, so it is requested again in full
+            LOGGER.warning("Request to %s returned no rates: %.200r", url, result)
+
+            return None
+
+        if store is not None and date < datetime.date.today():
+            try:
+                store.set("historical", date, result)
+            except OSError as e:
+                LOGGER.warning(e)
+
+        if cache is not None:
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+
+            if etag or last_modified:
+                cache.set(get_validators_key(url), (etag, last_modified), None)
+
+        return result
 
     LOGGER.warning("Request to %s returned %s", url, response.status_code)
 
 
+class OpenExchangeRatesProvider(BaseProvider):
+    """Rates of https://openexchangerates.org, historical rates being
+    fetched concurrently by `fetch_many`.
+    """
+
+    def __init__(self, app_id=None, workers=None, rate_limit=None):
+        self.app_id = app_id or getattr(
+            django_settings, "OPENEXCHANGERATES_APP_ID", None
+        )
+
+        if not self.app_id:
+            raise ValueError("The openexchangerates APP ID is required")
+
+        self.workers = workers
+        self.rate_limit = rate_limit
+
+    def latest(self):
+        result = rate_request(self.app_id)
+
+        return result.get("rates") if result else None
+
+    def historical(self, date):
+        result = rate_request(self.app_id, date=date)
+
+        return result.get("rates") if result else None
+
+    def fetch_many(self, dates):
+        for date, result in fetch_rates(
+            self.app_id, dates, self.workers, self.rate_limit
+        ):
+            yield date, result.get("rates") if result else None
+
+    def discard(self, date=None):
+        cache = get_validators_cache()
+
+        if date is None and cache is not None:
+            # Rates must be requested again in full next time
+            cache.delete(
+                get_validators_key(settings.OPENEXCHANGERATES_URL + "/latest.json")
+            )
+
+
 def sync_rates(app_id, date=None):
-    result = rate_request(app_id, date=None)
+    return sync(OpenExchangeRatesProvider(app_id), date)
 
-    if not result:
-        return
 
-    for currency, rate in result["rates"].items():
-        currency_rate, created = CurrencyRate.objects.update_or_create(
-            currency, rate, date
-        )
-        if currency_rate:
-            if created:
-                msg = "Create currency %s with %s"
-            else:
-                msg = "Syncing currency %s with %s"
+def fetch_rates(app_id, dates, workers=None, rate_limit=None):
+    """Yield a `(date, result)` tuple for each of `dates`, in order.
+
+    Requests run in a pool of `workers` threads and start at most
+    `rate_limit` times per second. Failed requests and malformed responses
+    are logged and yield None.
+    """
+    workers = workers or settings.RATES_SYNC_WORKERS
+    limiter = RateLimiter(rate_limit or settings.RATES_SYNC_RATE_LIMIT)
+    session = get_session(workers)
+
+    def fetch(date):
+        limiter.wait()
+
+        try:
+            return rate_request(app_id, date=date, session=session)
+        except (requests.RequestException, ValueError) as e:
+            LOGGER.warning(e)
+
+    with ThreadPoolExecutor(
+        max_workers=workers,
+        thread_name_prefix="metasettings-rates",
+    ) as executor:
+        for date, result in zip(dates, executor.map(fetch, dates)):
+            yield date, result
+
 
-            LOGGER.info(msg, currency, rate)
+def sync_many_rates(app_id, dates, workers=None, rate_limit=None, batch_size=12):
+    """Fetch the rates of the months of `dates` concurrently and write them
+    by batches of `batch_size` months, see `providers.sync_many`.
+    """
+    return sync_many(
+        OpenExchangeRatesProvider(app_id, workers, rate_limit), dates, batch_size
+    )
@@ -0,0 +1,206 @@
+import csv
+import datetime
+import decimal
+import json
+import logging
+import zlib
+
+from django.db import transaction
+from django.utils.functional import cached_property
+from django.utils.module_loading import import_string
+
+from . import settings
+from .models import CurrencyRate
+from .util import batches
+
+LOGGER = logging.getLogger(__name__)
+
+
+class BaseProvider(object):
+    """Source of currency rates, each fetch returning a mapping of
+    currencies to rates against a common base currency, or None when the
+    rates are not available.
+    """
+
+    def latest(self):
+        raise NotImplementedError
+
+    def historical(self, date):
+        raise NotImplementedError
+
+    def fetch_many(self, dates):
+        """Yield a `(date, rates)` tuple for each of `dates`, in order.
+
+        Providers able to return many dates at once should override it.
+        """
+        for date in dates:
+            yield date, self.historical(date)
+
+    def discard(self, date=None):
+        """Called when the rates of `date` could not be written, so that
+        they are fetched again next time.
+        """
+
+
+class FileProvider(BaseProvider):
+    """Rates read from a local file, either a CSV file of `date,currency,rate`
+    rows, the date being empty for the latest rates, or a JSON file:
+
+        {"latest": {"EUR": 0.92}, "historical": {"2013-10-01": {"EUR": 0.73}}}
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    @cached_property
+    def data(self):
+        if self.path.endswith(".json"):
+            with open(self.path) as f:
+                data = json.load(f, parse_float=decimal.Decimal)
+
+            return data.get("latest"), dict(
+                (parse_date(value), rates)
+                for value, rates in data.get("historical", {}).items()
+            )
+
+        latest, historical = {}, {}
+
+        with open(self.path, newline="") as f:
+            for i, row in enumerate(csv.reader(f)):
+                if not row or row[0].startswith("#"):
+                    continue
+
+                try:
+                    value, currency, rate = row
+                    rate = decimal.Decimal(rate.strip())
+                    date = parse_date(value) if value.strip() else None
+                except (ValueError, decimal.InvalidOperation):
+                    if i == 0:
+                        continue
+
+                    raise ValueError("Invalid row {}: {}".format(i + 1, ",".join(row)))
+
+                if date is None:
+                    latest[currency.strip()] = rate
+                else:
+                    historical.setdefault(date, {})[currency.strip()] = rate
+
+        return latest, historical
+
+    def latest(self):
+        return self.data[0] or None
+
+    def historical(self, date):
+        return self.data[1].get(date)
+
+
+class FakeProvider(BaseProvider):
+    """In-process provider for tests and load tests.
+
+    It returns `rates` and the rates of `historical` by date when given,
+    deterministic rates of every `METASETTINGS_CURRENCY_CHOICES` currency
+    otherwise. Fetched dates are recorded in `requests`, None standing for
+    the latest rates.
+    """
+
+    def __init__(self, rates=None, historical=None):
+        self.rates = rates
+        self.historical_rates = historical
+        self.requests = []
+
+    def generate(self, date=None):
+        return dict(
+            (
+                code,
+                decimal.Decimal(
+                    zlib.crc32("{}:{}".format(code, date).encode()) % 100000 + 1
+                )
+                / 1000,
+            )
+            for code, label in settings.CURRENCY_CHOICES
+        )
+
+    def latest(self):
+        self.requests.append(None)
+
+        if self.rates is not None:
+            return self.rates
+
+        return self.generate()
+
+    def historical(self, date):
+        self.requests.append(date)
+
+        if self.historical_rates is not None:
+            return self.historical_rates.get(date)
+
+        return self.generate(date)
+
+
+def parse_date(value):
+    return datetime.datetime.strptime(value.strip(), "%Y-%m-%d").date()
+
+
+def get_provider(backend=None, **options):
+    """Return an instance of the provider class at the dotted path
+    `backend`, `METASETTINGS_RATES_PROVIDER` by default, built with
+    `METASETTINGS_RATES_PROVIDER_OPTIONS` updated with `options`.
+    """
+    provider_class = import_string(backend or settings.RATES_PROVIDER)
+
+    return provider_class(**dict(settings.RATES_PROVIDER_OPTIONS, **options))
+
+
+def sync(provider, date=None, daily=False):
+    """Write the rates of the month of `date`, of its day when `daily` is
+    set, or the latest rates, fetched from `provider`, then share them, see
+    `CurrencyRateManager.share`.
+
+    Returns the results of `CurrencyRateManager.sync`, None when no rates
+    were fetched.
+    """
+    rates = provider.historical(date) if date else provider.latest()
+
+    if not rates:
+        return None
+
+    try:
+        results = CurrencyRate.objects.sync(rates, date, daily=daily)
+    except Exception:
+        provider.discard(date)
+        raise
+
+    CurrencyRate.objects.share()
+
+    for currency in results["created"]:
+        LOGGER.info("Create currency %s with %s", currency, rates[currency])
+
+    for currency in results["updated"]:
+        LOGGER.info("Syncing currency %s with %s", currency, rates[currency])
+
+    return results
+
+
+def sync_many(provider, dates, batch_size=12, daily=False):
+    """Fetch the rates of the months of `dates`, or of the days when `daily`
+    is set, with `provider.fetch_many` and write them from the calling
+    thread, by batches of `batch_size` dates in a single transaction.
+
+    Yield a `(date, results)` tuple for each of `dates`, in order, results
+    being None when the rates could not be fetched.
+    """
+    dates = list(dates)
+
+    for batch in batches(provider.fetch_many(dates), batch_size):
+        with transaction.atomic():
+            synced = [
+                (date, CurrencyRate.objects.sync(rates, date, daily=daily))
+                if rates
+                else (date, None)
+                for date, rates in batch
+            ]
+
+        CurrencyRate.objects.share()
+
+        for date, results in synced:
+            yield date, results
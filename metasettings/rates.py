@@ -0,0 +1,210 @@
+import datetime
+import decimal
+
+from bisect import bisect_right
+from collections.abc import Mapping
+
+from . import settings
+
+
+# Cross rates are computed with extra digits so that multiplying an amount
+# by one of them, in the default context, is within a few units of the last
+# of its 28 significant digits from dividing then multiplying by both rates.
+# Amounts rounded to a minor unit only differ when the exact result is that
+# close to a rounding boundary.
+FACTOR_PRECISION = 50
+
+
+def quantize(amount, exponent=None, rounding=None):
+    """Round a converted `amount` to `exponent` ("0.01" for instance) with
+    the `rounding` mode of the `decimal` module, which default to
+    `METASETTINGS_RATES_QUANTIZE` and `METASETTINGS_RATES_ROUNDING`.
+
+    Amounts are left as is when no exponent is configured.
+    """
+    if exponent is None:
+        exponent = settings.RATES_QUANTIZE
+
+    if exponent is None or not isinstance(amount, decimal.Decimal):
+        return amount
+
+    return amount.quantize(
+        decimal.Decimal(exponent), rounding=rounding or settings.RATES_ROUNDING
+    )
+
+
+class RateTable(Mapping):
+    """Immutable snapshot of the rates of a period, safe to share between
+    threads.
+
+    It maps currencies to `CurrencyRate` objects and holds a dense matrix of
+    cross rates between `METASETTINGS_CURRENCY_CHOICES` currencies indexed
+    by currency ordinal, so converting an amount is a single multiplication.
+    """
+
+    def __init__(self, currency_rates, year=None, month=None):
+        self.year = year
+        self.month = month
+
+        self._currency_rates = dict(currency_rates)
+
+        self._rates = dict(
+            (currency, decimal.Decimal(currency_rate.rate))
+            for currency, currency_rate in self._currency_rates.items()
+            if currency_rate.rate
+        )
+
+        codes = [
+            code for code, label in settings.CURRENCY_CHOICES if code in self._rates
+        ]
+
+        self.ordinals = dict((code, i) for i, code in enumerate(codes))
+
+        # Factors of currencies out of the matrix, computed on first use
+        self._factors = {}
+
+        with decimal.localcontext() as ctx:
+            ctx.prec = FACTOR_PRECISION
+
+            self.factors = tuple(
+                tuple(
+                    self._rates[to_code] / self._rates[from_code] for to_code in codes
+                )
+                for from_code in codes
+            )
+
+    def factor(self, from_currency, to_currency):
+        """Return the multiplier converting `from_currency` amounts to
+        `to_currency`.
+        """
+        ordinals = self.ordinals
+
+        if from_currency in ordinals and to_currency in ordinals:
+            return self.factors[ordinals[from_currency]][ordinals[to_currency]]
+
+        key = (from_currency, to_currency)
+
+        factor = self._factors.get(key)
+
+        if factor is None:
+            with decimal.localcontext() as ctx:
+                ctx.prec = FACTOR_PRECISION
+
+                factor = self._rates[to_currency] / self._rates[from_currency]
+
+            self._factors[key] = factor
+
+        return factor
+
+    def convert(self, from_currency, to_currency, amount):
+        return amount * self.factor(from_currency, to_currency)
+
+    def convert_array(self, from_currencies, to_currency, amounts, ceil=False):
+        """Convert a NumPy array of float or integer (minor unit) amounts,
+        `from_currencies` being a currency or an array of currencies.
+
+        Results are floats in the unit of `amounts`, rounded up to integers
+        when `ceil` is set.
+        """
+        import numpy
+
+        amounts = numpy.asarray(amounts)
+
+        if isinstance(from_currencies, str):
+            codes, inverse = numpy.array([from_currencies]), None
+        else:
+            codes, inverse = numpy.unique(
+                numpy.asarray(from_currencies), return_inverse=True
+            )
+
+        factors = numpy.array(
+            [
+                1.0 if code == to_currency else float(self.factor(code, to_currency))
+                for code in codes.tolist()
+            ]
+        )
+
+        result = amounts * (factors[0] if inverse is None else factors[inverse])
+
+        if ceil:
+            result = numpy.ceil(result)
+
+        return result
+
+    def __getitem__(self, currency):
+        return self._currency_rates[currency]
+
+    def __iter__(self):
+        return iter(self._currency_rates)
+
+    def __len__(self):
+        return len(self._currency_rates)
+
+    def __repr__(self):
+        return "RateTable(year={0}, month={1}, currencies={2})".format(
+            self.year, self.month, len(self)
+        )
+
+
+class RateIndex(object):
+    """Dated rates of each currency sorted by the date they take effect on,
+    to find the rate in effect on any date with a binary search.
+
+    `dated_rates` is an iterable of `(date, currency, rate)` tuples, later
+    ones replacing earlier ones of the same currency and date.
+    """
+
+    def __init__(self, dated_rates):
+        points = {}
+
+        for date, currency, rate in dated_rates:
+            points.setdefault(currency, {})[date.toordinal()] = decimal.Decimal(rate)
+
+        self._ordinals = {}
+        self._rates = {}
+
+        for currency, values in points.items():
+            ordinals = sorted(values)
+
+            self._ordinals[currency] = ordinals
+            self._rates[currency] = [values[ordinal] for ordinal in ordinals]
+
+        self.changes = sorted(
+            set(ordinal for ordinals in self._ordinals.values() for ordinal in ordinals)
+        )
+
+    def rate_at(self, currency, date):
+        """Return the most recent rate of `currency` on or before `date`,
+        None when there is none.
+        """
+        ordinals = self._ordinals.get(currency)
+
+        if not ordinals:
+            return None
+
+        i = bisect_right(ordinals, date.toordinal()) - 1
+
+        return self._rates[currency][i] if i >= 0 else None
+
+    def rates_at(self, date):
+        rates = {}
+
+        for currency in self._ordinals:
+            rate = self.rate_at(currency, date)
+
+            if rate is not None:
+                rates[currency] = rate
+
+        return rates
+
+    def effective_date(self, date):
+        """Return the most recent date on or before `date` when a rate took
+        effect, rates in effect being the same on both dates. None when no
+        rate took effect yet.
+        """
+        i = bisect_right(self.changes, date.toordinal()) - 1
+
+        return datetime.date.fromordinal(self.changes[i]) if i >= 0 else None
+
+    def __len__(self):
+        return sum(len(ordinals) for ordinals in self._ordinals.values())
@@ -42,3 +42,99 @@ TIME_ZONE = getattr(
     "METASETTINGS_TIME_ZONE",
     getattr(settings, "TIME_ZONE", choices.TIME_ZONE),
 )
+
+GEOIP_MODE = getattr(settings, "METASETTINGS_GEOIP_MODE", "auto")
+
+GEOIP_CACHE_SIZE = getattr(settings, "METASETTINGS_GEOIP_CACHE_SIZE", 10000)
+
+GEOIP_CACHE_TTL = getattr(settings, "METASETTINGS_GEOIP_CACHE_TTL", 60 * 60)
+
+GEOIP_CACHE_IPV4_PREFIX = getattr(settings, "METASETTINGS_GEOIP_CACHE_IPV4_PREFIX", 32)
+
+GEOIP_CACHE_IPV6_PREFIX = getattr(settings, "METASETTINGS_GEOIP_CACHE_IPV6_PREFIX", 128)
+
+MIDDLEWARE_SKIP_PATHS = getattr(settings, "METASETTINGS_MIDDLEWARE_SKIP_PATHS", ())
+
+MIDDLEWARE_SKIP_USER_AGENTS = getattr(
+    settings,
+    "METASETTINGS_MIDDLEWARE_SKIP_USER_AGENTS",
+    r"bot|crawl|spider|slurp|facebookexternalhit|kube-probe|HealthChecker|Pingdom",
+)
+
+IP_INDEX_PATH = getattr(settings, "METASETTINGS_IP_INDEX_PATH", None)
+
+GEOIP_EXECUTOR_WORKERS = getattr(settings, "METASETTINGS_GEOIP_EXECUTOR_WORKERS", 4)
+
+GEOIP_SHARED_CACHE_ALIAS = getattr(
+    settings, "METASETTINGS_GEOIP_SHARED_CACHE_ALIAS", None
+)
+
+GEOIP_SHARED_CACHE_TTL = getattr(
+    settings, "METASETTINGS_GEOIP_SHARED_CACHE_TTL", 24 * 60 * 60
+)
+
+GEOIP_SHARED_CACHE_VERSION = getattr(
+    settings, "METASETTINGS_GEOIP_SHARED_CACHE_VERSION", None
+)
+
+WARMUP = getattr(settings, "METASETTINGS_WARMUP", False)
+
+RATES_CACHE_TTL = getattr(settings, "METASETTINGS_RATES_CACHE_TTL", 15 * 60)
+
+RATES_CACHE_PERIODS = getattr(settings, "METASETTINGS_RATES_CACHE_PERIODS", 24)
+
+RATES_CACHE_YEARS = getattr(settings, "METASETTINGS_RATES_CACHE_YEARS", 2)
+
+OPENEXCHANGERATES_URL = getattr(
+    settings, "METASETTINGS_OPENEXCHANGERATES_URL", "http://openexchangerates.org/api"
+)
+
+OPENEXCHANGERATES_TIMEOUT = getattr(
+    settings, "METASETTINGS_OPENEXCHANGERATES_TIMEOUT", (5, 30)
+)
+
+OPENEXCHANGERATES_RETRIES = getattr(
+    settings, "METASETTINGS_OPENEXCHANGERATES_RETRIES", 3
+)
+
+OPENEXCHANGERATES_BACKOFF = getattr(
+    settings, "METASETTINGS_OPENEXCHANGERATES_BACKOFF", 0.5
+)
+
+OPENEXCHANGERATES_CACHE_ALIAS = getattr(
+    settings, "METASETTINGS_OPENEXCHANGERATES_CACHE_ALIAS", None
+)
+
+OPENEXCHANGERATES_STORE_PATH = getattr(
+    settings, "METASETTINGS_OPENEXCHANGERATES_STORE_PATH", None
+)
+
+RATES_PROVIDER = getattr(
+    settings,
+    "METASETTINGS_RATES_PROVIDER",
+    "metasettings.openexchangerates.OpenExchangeRatesProvider",
+)
+
+RATES_PROVIDER_OPTIONS = getattr(settings, "METASETTINGS_RATES_PROVIDER_OPTIONS", {})
+
+RATES_SYNC_WORKERS = getattr(settings, "METASETTINGS_RATES_SYNC_WORKERS", 4)
+
+RATES_SYNC_RATE_LIMIT = getattr(settings, "METASETTINGS_RATES_SYNC_RATE_LIMIT", None)
+
+RATES_SNAPSHOT_PATH = getattr(settings, "METASETTINGS_RATES_SNAPSHOT_PATH", None)
+
+RATES_SNAPSHOT_CHECK_INTERVAL = getattr(
+    settings, "METASETTINGS_RATES_SNAPSHOT_CHECK_INTERVAL", 1
+)
+
+RATES_SHARED_CACHE_ALIAS = getattr(
+    settings, "METASETTINGS_RATES_SHARED_CACHE_ALIAS", None
+)
+
+RATES_SHARED_CACHE_TTL = getattr(
+    settings, "METASETTINGS_RATES_SHARED_CACHE_TTL", 7 * 24 * 60 * 60
+)
+
+RATES_QUANTIZE = getattr(settings, "METASETTINGS_RATES_QUANTIZE", None)
+
+RATES_ROUNDING = getattr(settings, "METASETTINGS_RATES_ROUNDING", "ROUND_HALF_EVEN")
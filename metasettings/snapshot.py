@@ -0,0 +1,362 @@
+import decimal
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+
+from .exceptions import InvalidRateSnapshot
+
+
+logger = logging.getLogger("django.metasettings")
+
+MAGIC = b"MSRS"
+
+VERSION = 1
+
+# magic, version, decimal places, generation, currencies count, periods count
+HEADER = struct.Struct(">4sBBxxQII")
+
+CURRENCY_WIDTH = 3
+
+# year, month, both 0 for the default rates
+PERIOD = struct.Struct(">HBx")
+
+RATE_WIDTH = 8
+
+MISSING = -1
+
+
+class RateSnapshot(object):
+    """Rates of every period stored in a single buffer, usually a read-only
+    memory map shared by every process of a host.
+
+    The binary format is a header followed by the sorted currency codes,
+    the sorted periods and, for each period, one signed 64 bits integer
+    per currency: the rate scaled by `10 ** places`, or -1 when missing.
+    """
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+
+        try:
+            (
+                magic,
+                version,
+                self.places,
+                self.generation,
+                currencies_count,
+                periods_count,
+            ) = HEADER.unpack_from(buffer, 0)
+        except struct.error:
+            raise InvalidRateSnapshot("Invalid rate snapshot: truncated header")
+
+        if magic != MAGIC or version != VERSION:
+            raise InvalidRateSnapshot("Invalid rate snapshot: unknown format")
+
+        offset = HEADER.size
+        size = offset + currencies_count * CURRENCY_WIDTH
+        size += periods_count * (PERIOD.size + currencies_count * RATE_WIDTH)
+
+        if len(buffer) < size:
+            raise InvalidRateSnapshot("Invalid rate snapshot: truncated data")
+
+        self.currencies = [
+            bytes(buffer[start : start + CURRENCY_WIDTH]).decode("ascii")
+            for start in range(
+                offset, offset + currencies_count * CURRENCY_WIDTH, CURRENCY_WIDTH
+            )
+        ]
+
+        offset += currencies_count * CURRENCY_WIDTH
+
+        self.periods = {}
+
+        for i in range(periods_count):
+            year, month = PERIOD.unpack_from(buffer, offset + i * PERIOD.size)
+
+            self.periods[(year or None, month or None)] = i
+
+        self._rates_offset = offset + periods_count * PERIOD.size
+        self._row = struct.Struct(">{}q".format(currencies_count))
+
+    @classmethod
+    def open(cls, path, memory=False):
+        """Open the snapshot stored at `path`, memory-mapped unless `memory`."""
+        with open(path, "rb") as f:
+            if memory:
+                return cls(f.read())
+
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def get_rates(self, year=None, month=None):
+        """Return the rates of the period as a dict of currencies to
+        decimals, None when the period is not in the snapshot.
+        """
+        index = self.periods.get((year, month) if year and month else (None, None))
+
+        if index is None:
+            return None
+
+        values = self._row.unpack_from(
+            self.buffer, self._rates_offset + index * self._row.size
+        )
+
+        return dict(
+            (currency, decimal.Decimal(value).scaleb(-self.places))
+            for currency, value in zip(self.currencies, values)
+            if value != MISSING
+        )
+
+    def close(self):
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+
+    def __contains__(self, period):
+        return period in self.periods
+
+    def __len__(self):
+        return len(self.periods)
+
+
+def build(periods, generation=1, places=2):
+    """Serialize `periods`, a mapping of `(year, month)` tuples, `(None,
+    None)` for the default rates, to mappings of currencies to rates.
+    """
+    currencies = sorted(set(code for rates in periods.values() for code in rates))
+
+    keys = sorted(periods, key=lambda period: (period[0] or 0, period[1] or 0))
+
+    chunks = [
+        HEADER.pack(MAGIC, VERSION, places, generation, len(currencies), len(keys))
+    ]
+
+    for code in currencies:
+        if len(code.encode("ascii")) != CURRENCY_WIDTH:
+            raise InvalidRateSnapshot("Invalid currency code {}".format(code))
+
+        chunks.append(code.encode("ascii"))
+
+    for year, month in keys:
+        chunks.append(PERIOD.pack(year or 0, month or 0))
+
+    row = struct.Struct(">{}q".format(len(currencies)))
+
+    for key in keys:
+        rates = periods[key]
+
+        chunks.append(
+            row.pack(
+                *(
+                    int(decimal.Decimal(rates[code]).scaleb(places).to_integral_value())
+                    if code in rates
+                    else MISSING
+                    for code in currencies
+                )
+            )
+        )
+
+    return b"".join(chunks)
+
+
+def read_generation(path):
+    """Return the generation of the snapshot at `path`, 0 when there is none."""
+    try:
+        with open(path, "rb") as f:
+            header = f.read(HEADER.size)
+    except (IOError, OSError):
+        return 0
+
+    try:
+        magic, version, places, generation, _, _ = HEADER.unpack(header)
+    except struct.error:
+        return 0
+
+    if magic != MAGIC:
+        return 0
+
+    return generation
+
+
+def write(periods, path, places=2):
+    """Build the snapshot of `periods` with a new generation, then atomically
+    replace `path` with it.
+
+    Generations are the current time in microseconds, or follow the one at
+    `path` if it is ahead: concurrent writers reading the same generation
+    still write different ones.
+
+    Returns the generation of the new snapshot.
+    """
+    generation = max(read_generation(path) + 1, time.time_ns() // 1000)
+
+    data = build(periods, generation=generation, places=places)
+
+    directory = os.path.dirname(os.path.abspath(path))
+
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".ratesnapshot")
+
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+
+        os.replace(tmp_path, path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+
+    return generation
+
+
+class SnapshotFile(object):
+    """Snapshot at `path` opened once per process and reopened when the
+    generation of the file changes, which is checked at most every
+    `interval` seconds.
+    """
+
+    def __init__(self, path, interval=1):
+        self.path = path
+        self.interval = interval
+        self.snapshot = None
+        self._checked = None
+        self._lock = threading.Lock()
+
+    def is_checked(self):
+        """Return whether the snapshot was checked less than `interval`
+        seconds ago, `get` then returning it without any I/O.
+        """
+        return (
+            self._checked is not None
+            and time.monotonic() < self._checked + self.interval
+        )
+
+    def get(self):
+        now = time.monotonic()
+
+        if self._checked is not None and now < self._checked + self.interval:
+            return self.snapshot
+
+        with self._lock:
+            generation = read_generation(self.path)
+
+            if generation == 0:
+                self.snapshot = None
+            elif self.snapshot is None or self.snapshot.generation != generation:
+                # The previous map is left to the garbage collector, other
+                # threads may still be reading it.
+                try:
+                    self.snapshot = RateSnapshot.open(self.path)
+                except (IOError, OSError, InvalidRateSnapshot):
+                    self.snapshot = None
+
+            self._checked = now
+
+        return self.snapshot
+
+
+# Generation of the snapshot published in a shared cache
+GENERATION_KEY = "metasettings:rates:generation"
+
+# Counter allocating generations to publishers
+COUNTER_KEY = "metasettings:rates:counter"
+
+
+def get_snapshot_key(generation):
+    """Return the key of the snapshot of `generation` in a shared cache."""
+    return "metasettings:rates:snapshot:{}".format(generation)
+
+
+def next_generation(cache):
+    """Allocate a generation from the counter of `cache`, atomically on
+    backends with an atomic `incr`.
+
+    A missing counter, after an eviction or a restart of the cache, starts
+    again from the current time in microseconds: new generations are never
+    below ones allocated before.
+    """
+    cache.add(COUNTER_KEY, int(time.time() * 10**6), None)
+
+    try:
+        return cache.incr(COUNTER_KEY)
+    except ValueError:
+        # Evicted between add and incr
+        return int(time.time() * 10**6)
+
+
+def publish(periods, alias, timeout=None, places=2):
+    """Store the snapshot of `periods` in the Django cache `alias` under a
+    new generation, then publish that generation.
+
+    Returns the generation of the new snapshot.
+    """
+    from django.core.cache import caches
+
+    cache = caches[alias]
+
+    generation = next_generation(cache)
+
+    cache.set(
+        get_snapshot_key(generation),
+        build(periods, generation=generation, places=places),
+        timeout,
+    )
+    cache.set(GENERATION_KEY, generation, None)
+
+    return generation
+
+
+class SharedSnapshot(object):
+    """Snapshot published in the Django cache `alias`, the small generation
+    key being checked at most every `interval` seconds and the snapshot
+    itself retrieved only when it changes.
+    """
+
+    def __init__(self, alias, interval=1):
+        self.alias = alias
+        self.interval = interval
+        self.snapshot = None
+        self._checked = None
+        self._lock = threading.Lock()
+
+    def is_checked(self):
+        """Return whether the snapshot was checked less than `interval`
+        seconds ago, `get` then returning it without any I/O.
+        """
+        return (
+            self._checked is not None
+            and time.monotonic() < self._checked + self.interval
+        )
+
+    def get(self):
+        now = time.monotonic()
+
+        if self._checked is not None and now < self._checked + self.interval:
+            return self.snapshot
+
+        from django.core.cache import caches
+
+        with self._lock:
+            cache = caches[self.alias]
+
+            try:
+                generation = cache.get(GENERATION_KEY)
+
+                if generation is None:
+                    self.snapshot = None
+                elif self.snapshot is None or self.snapshot.generation != generation:
+                    data = cache.get(get_snapshot_key(generation))
+
+                    try:
+                        self.snapshot = RateSnapshot(data)
+                    except (TypeError, InvalidRateSnapshot):
+                        # Not stored yet or evicted, try again on next check
+                        pass
+            except Exception as e:
+                # Keep the current snapshot while the cache is unavailable
+                logger.warning(e)
+
+            self._checked = now
+
+        return self.snapshot
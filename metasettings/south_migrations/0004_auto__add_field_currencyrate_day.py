@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+import datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+
+class Migration(SchemaMigration):
+    def forwards(self, orm):
+        # Adding field 'CurrencyRate.day'
+        db.add_column(
+            "metasettings_currencyrate",
+            "day",
+            self.gf("django.db.models.fields.PositiveIntegerField")(
+                null=True, blank=True
+            ),
+            keep_default=False,
+        )
+
+    def backwards(self, orm):
+        # Deleting field 'CurrencyRate.day'
+        db.delete_column("metasettings_currencyrate", "day")
+
+    models = {
+        "metasettings.currencyrate": {
+            "Meta": {"object_name": "CurrencyRate"},
+            "currency": ("django.db.models.fields.CharField", [], {"max_length": "3"}),
+            "date_last_sync": (
+                "django.db.models.fields.DateTimeField",
+                [],
+                {"auto_now": "True", "blank": "True"},
+            ),
+            "day": (
+                "django.db.models.fields.PositiveIntegerField",
+                [],
+                {"null": "True", "blank": "True"},
+            ),
+            "id": ("django.db.models.fields.AutoField", [], {"primary_key": "True"}),
+            "month": (
+                "django.db.models.fields.PositiveIntegerField",
+                [],
+                {"null": "True", "blank": "True"},
+            ),
+            "rate": (
+                "django.db.models.fields.DecimalField",
+                [],
+                {"max_digits": "9", "decimal_places": "2"},
+            ),
+            "year": (
+                "django.db.models.fields.PositiveIntegerField",
+                [],
+                {"null": "True", "blank": "True"},
+            ),
+        }
+    }
+
+    complete_apps = ["metasettings"]
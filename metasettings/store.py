@@ -0,0 +1,45 @@
+import gzip
+import json
+import os
+import tempfile
+
+
+class PayloadStore(object):
+    """Directory of gzipped JSON payloads keyed by endpoint and date, used
+    to keep responses which never change, such as historical rates.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def get_path(self, endpoint, date):
+        return os.path.join(self.path, endpoint, "{:%Y-%m-%d}.json.gz".format(date))
+
+    def get(self, endpoint, date):
+        try:
+            with gzip.open(self.get_path(endpoint, date), "rt") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def set(self, endpoint, date, payload):
+        """Atomically store `payload`, concurrent readers never see a
+        partially written file.
+        """
+        path = self.get_path(endpoint, date)
+
+        directory = os.path.dirname(path)
+
+        os.makedirs(directory, exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".payload")
+
+        try:
+            # Both files are flushed and closed before the rename
+            with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb") as f:
+                f.write(json.dumps(payload).encode("utf-8"))
+
+            os.replace(tmp_path, path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
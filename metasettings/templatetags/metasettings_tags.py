@@ -133,12 +133,26 @@ class ConvertAmountNode(template.Node):
 
         return cls(*cls_args, **cls_kwargs)
 
-    def __init__(self, from_currency, to_currency, amount, ceil=False, asvar=None):
+    def __init__(
+        self, from_currency, to_currency, amount, ceil=False, asvar=None, rates=None
+    ):
         self.from_currency = from_currency
         self.to_currency = to_currency
         self.amount = amount
         self.ceil = ceil
         self.asvar = asvar
+        self.rates = rates
+
+    def get_rates(self, context):
+        if self.rates:
+            return self.rates.resolve(context)
+
+        metasettings = getattr(context.get("request"), "metasettings", None)
+
+        if metasettings is not None:
+            return metasettings.rates
+
+        return None
 
     def render(self, context):
         from_currency = self.from_currency.resolve(context)
@@ -149,7 +163,9 @@ class ConvertAmountNode(template.Node):
 
         ceil = self.ceil and self.ceil.resolve(context) or self.ceil
 
-        amount = _convert_amount(from_currency, to_currency, amount, ceil=ceil)
+        amount = _convert_amount(
+            from_currency, to_currency, amount, ceil=ceil, rates=self.get_rates(context)
+        )
 
         if self.asvar:
             context[self.asvar] = amount
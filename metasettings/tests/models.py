@@ -12,3 +12,9 @@ class Project(models.Model):
 class AllowNull(models.Model):
     currency = CurrencyField(null=True)
     timezone = TimezoneField(null=True)
+
+
+class Pledge(models.Model):
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    currency = CurrencyField()
+    date = models.DateField(null=True)
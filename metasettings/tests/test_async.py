@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import threading
+
+from asgiref.sync import sync_to_async
+from mock import patch
+
+from django.http import HttpResponse
+from django.test import TestCase
+from django.test.client import RequestFactory
+
+from metasettings import geoip, settings
+from metasettings.middleware import MetasettingsMiddleware
+from metasettings.models import (
+    CurrencyRate,
+    aconvert_amount,
+    aget_currency_from_request,
+    aget_timezone_from_request,
+)
+from metasettings.snapshot import SharedSnapshot
+
+
+class AsyncTests(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+        geoip.resolutions.clear()
+        CurrencyRate.objects.invalidate()
+
+    def tearDown(self):
+        geoip.resolutions.clear()
+        CurrencyRate.objects.invalidate()
+
+    async def test_get_from_request(self):
+        request = self.factory.get("/", REMOTE_ADDR="69.197.132.80")
+
+        with patch.object(geoip, "get_reader") as get_reader:
+            get_reader.return_value.city.return_value = {
+                "country_code": "US",
+                "region": "NY",
+            }
+
+            self.assertEqual(await aget_currency_from_request(request), "USD")
+            self.assertEqual(
+                await aget_timezone_from_request(request), "America/New_York"
+            )
+
+            self.assertEqual(get_reader.return_value.city.call_count, 1)
+
+    async def test_get_from_request_with_middleware(self):
+        request = self.factory.get("/", REMOTE_ADDR="69.197.132.80")
+
+        MetasettingsMiddleware(lambda request: HttpResponse())(request)
+
+        with patch.object(geoip, "get_reader") as get_reader:
+            get_reader.return_value.city.return_value = {
+                "country_code": "JP",
+                "region": "",
+            }
+
+            self.assertEqual(await aget_currency_from_request(request), "JPY")
+            self.assertEqual(request.metasettings.timezone, "Asia/Tokyo")
+
+            self.assertEqual(get_reader.return_value.city.call_count, 1)
+
+    async def test_convert_amount(self):
+        create = sync_to_async(CurrencyRate.objects.create)
+
+        await create(currency="EUR", rate="0.50")
+        await create(currency="USD", rate="1.00")
+
+        self.assertEqual(await aconvert_amount("EUR", "USD", 15), 30)
+        self.assertEqual(await aconvert_amount("EUR", "USD", 15, ceil=True), 30)
+        self.assertEqual(await aconvert_amount("EUR", "EUR", 15), 15)
+
+    async def test_snapshot_is_checked_outside_event_loop(self):
+        create = sync_to_async(CurrencyRate.objects.create)
+
+        await create(currency="EUR", rate="0.50")
+        await create(currency="USD", rate="1.00")
+
+        threads = []
+        get = SharedSnapshot.get
+
+        def check(source):
+            threads.append(threading.current_thread())
+
+            return get(source)
+
+        self.addCleanup(setattr, CurrencyRate.objects, "_snapshot_source", None)
+        self.addCleanup(setattr, CurrencyRate.objects, "snapshot_generation", None)
+
+        with patch.multiple(
+            settings,
+            RATES_SHARED_CACHE_ALIAS="default",
+            RATES_SNAPSHOT_CHECK_INTERVAL=60,
+        ), patch.object(SharedSnapshot, "get", autospec=True, side_effect=check):
+            self.assertEqual(await aconvert_amount("EUR", "USD", 15), 30)
+            self.assertEqual(await aconvert_amount("EUR", "USD", 15), 30)
+
+        self.assertTrue(threads)
+        self.assertNotIn(threading.current_thread(), threads)
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from mock import patch
+
+from django.test import TestCase
+
+from metasettings.cache import LRUCache
+
+
+class LRUCacheTests(TestCase):
+    def test_eviction(self):
+        cache = LRUCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+
+        self.assertEqual(cache.get("a"), 1)
+
+        cache.set("c", 3)
+
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.get("c"), 3)
+        self.assertEqual(len(cache), 2)
+
+    def test_ttl(self):
+        cache = LRUCache(maxsize=2, ttl=10)
+
+        with patch("metasettings.cache.time.monotonic") as monotonic:
+            monotonic.return_value = 100
+            cache.set("a", 1)
+
+            monotonic.return_value = 109
+            self.assertEqual(cache.get("a"), 1)
+
+            monotonic.return_value = 110
+            self.assertIsNone(cache.get("a"))
+            self.assertEqual(len(cache), 0)
+
+    def test_disabled(self):
+        cache = LRUCache(maxsize=0)
+        cache.set("a", 1)
+
+        self.assertIsNone(cache.get("a"))
+
+    def test_info(self):
+        cache = LRUCache(maxsize=10)
+        cache.set("a", None)
+
+        self.assertIsNone(cache.get("a", "default"))
+        self.assertEqual(cache.get("b", "default"), "default")
+
+        info = cache.info()
+
+        self.assertEqual((info.hits, info.misses, info.currsize), (1, 1, 1))
+
+        cache.clear()
+
+        self.assertEqual(cache.info(), (0, 0, 10, 0))
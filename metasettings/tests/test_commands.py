@@ -6,24 +6,143 @@ try:
 except:
     from django.utils.unittest import skipUnless
 
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
 from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
 from dateutil.relativedelta import relativedelta
 
 from mock import patch
 
 from django.test.client import RequestFactory
 from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connections
 from django.test import TestCase
 from django.conf import settings
 
+from metasettings import openexchangerates
+from metasettings.benchmarks import BENCHMARKS, compare
 from metasettings.models import CurrencyRate, convert_amount, CurrencyRateManager
 from metasettings.settings import CURRENCY_CHOICES
+from metasettings.util import RateLimiter
+
+
+class RatesHandler(BaseHTTPRequestHandler):
+    """Serve `/historical/YYYY-MM-DD.json` with the month as EUR rate, later
+    months answering faster so responses complete out of order.
+    """
+
+    def do_GET(self):
+        self.server.paths.append(self.path)
+
+        month = int(self.path.split("?")[0][-10:-8])
+
+        if month == 3:
+            self.send_response(404)
+            self.end_headers()
+
+            return
+
+        time.sleep(0.01 * (12 - month))
+
+        body = json.dumps({"rates": {"EUR": month / 10.0, "USD": 1}}).encode()
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
 
 
 class CommandsTests(TestCase):
     def setUp(self):
         self.factory = RequestFactory()
 
+    def serve_rates(self):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), RatesHandler)
+        server.paths = []
+
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+
+        def stop():
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+        self.addCleanup(stop)
+
+        return server
+
+    def test_sync_rates_backfill(self):
+        CurrencyRate.objects.invalidate()
+
+        server = self.serve_rates()
+
+        stdout, stderr = StringIO(), StringIO()
+
+        with patch.object(
+            openexchangerates.settings,
+            "OPENEXCHANGERATES_URL",
+            "http://127.0.0.1:%d" % server.server_address[1],
+        ):
+            call_command(
+                "sync_rates",
+                app_id="app",
+                date_start="2013-01-15",
+                date_end="2013-06-01",
+                workers=3,
+                stdout=stdout,
+                stderr=stderr,
+            )
+
+        self.assertEqual(
+            stdout.getvalue().splitlines(),
+            [
+                "2013-%02d: 2 created, 0 updated, 0 unchanged" % month
+                for month in (1, 2, 4, 5, 6)
+            ],
+        )
+        self.assertEqual(stderr.getvalue().splitlines(), ["2013-03: failed"])
+        self.assertEqual(
+            sorted(path.split("?")[0] for path in server.paths),
+            ["/historical/2013-%02d-01.json" % month for month in range(1, 7)],
+        )
+
+        self.assertEqual(CurrencyRate.objects.filter(year=2013).count(), 10)
+        self.assertEqual(
+            str(CurrencyRate.objects.get(currency="EUR", year=2013, month=5).rate),
+            "0.50",
+        )
+        self.assertEqual(convert_amount("USD", "EUR", 10, year=2013, month=4), 4)
+
+        CurrencyRate.objects.invalidate()
+
+    def test_rate_limiter(self):
+        limiter = RateLimiter(50)
+
+        start = time.monotonic()
+
+        threads = [threading.Thread(target=limiter.wait) for i in range(5)]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        self.assertTrue(time.monotonic() - start >= 0.08)
+
     @skipUnless(
         settings.OPENEXCHANGERATES_APP_ID is not None,
         "OPENEXCHANGERATES_APP_ID not defined",
@@ -122,3 +241,122 @@ class CommandsTests(TestCase):
             self.assertEqual("%.2f" % amount, "20.52")
 
         amount = convert_amount("EUR", "USD", 15, ceil=True, year=2011, month=10)
+
+    def test_warmup(self):
+        from metasettings import geoip
+        from metasettings.models import currencies
+
+        currencies.__dict__.pop("countries", None)
+        CurrencyRate.objects.invalidate()
+
+        stdout, stderr = StringIO(), StringIO()
+
+        with patch.object(geoip, "get_reader") as get_reader:
+            call_command("metasettings_warmup", stdout=stdout, stderr=stderr)
+
+            self.assertTrue(get_reader.called)
+
+        steps = [line.split(":")[0] for line in stdout.getvalue().splitlines()]
+
+        self.assertEqual(
+            steps, ["currencies", "timezones", "locations", "rates", "geoip"]
+        )
+        self.assertEqual(stderr.getvalue(), "")
+
+        self.assertIn("countries", currencies.__dict__)
+        self.assertIn("FR", currencies.get_countries("EUR"))
+        self.assertEqual(CurrencyRate.objects.periods.info().currsize, 1)
+
+    def test_warmup_on_ready(self):
+        from django.apps import apps
+
+        from metasettings import settings as settings_module
+
+        config = apps.get_app_config("metasettings")
+
+        with patch.object(settings_module, "WARMUP", ["currencies"]):
+            with self.assertLogs("metasettings.apps", "INFO") as logs:
+                config.ready()
+
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn("Warmed up currencies in", logs.output[0])
+
+    def test_warmup_closes_connections(self):
+        from metasettings.warmup import warmup
+
+        connection = connections["default"]
+
+        # Test cases run in a transaction, which warmup leaves open
+        with patch.object(connection, "close") as close:
+            warmup(["rates"])
+
+            self.assertFalse(close.called)
+
+            with patch.object(connection, "in_atomic_block", False):
+                warmup(["rates"])
+
+            self.assertEqual(close.call_count, 1)
+
+    def test_warmup_unknown_step(self):
+        with self.assertRaises(CommandError):
+            call_command("metasettings_warmup", "unknown")
+
+    def test_benchmark(self):
+        stdout = StringIO()
+
+        call_command("metasettings_benchmark", number=10, repeat=2, stdout=stdout)
+
+        results = json.loads(stdout.getvalue())
+
+        self.assertEqual(
+            sorted(results["benchmarks"]), sorted(name for name, setup in BENCHMARKS)
+        )
+        self.assertEqual(results["benchmarks"]["convert_amount"]["number"], 10)
+        self.assertNotIn("comparison", results)
+
+    def test_benchmark_baseline(self):
+        directory = tempfile.mkdtemp()
+
+        self.addCleanup(shutil.rmtree, directory)
+
+        baseline = os.path.join(directory, "baseline.json")
+        output = os.path.join(directory, "results.json")
+
+        with open(baseline, "w") as f:
+            json.dump(
+                {
+                    "benchmarks": {
+                        "money_format": {"best": 1e-12},
+                        "get_client_ip": {"best": 1},
+                    }
+                },
+                f,
+            )
+
+        with self.assertRaisesRegex(CommandError, "Regressions: money_format"):
+            call_command(
+                "metasettings_benchmark",
+                "money_format",
+                "get_client_ip",
+                "currency",
+                number=10,
+                repeat=1,
+                baseline=baseline,
+                output=output,
+            )
+
+        with open(output) as f:
+            results = json.load(f)
+
+        self.assertEqual(results["comparison"]["money_format"]["status"], "regression")
+        self.assertEqual(
+            results["comparison"]["get_client_ip"]["status"], "improvement"
+        )
+        self.assertNotIn("currency", results["comparison"])
+
+        self.assertEqual(
+            compare(results, results)["currency"], {"ratio": 1.0, "status": "unchanged"}
+        )
+
+        with self.assertRaises(CommandError):
+            call_command("metasettings_benchmark", "unknown")
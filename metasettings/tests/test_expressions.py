@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from datetime import date
+from decimal import Decimal
+
+from django.db.models import Sum
+from django.test import TestCase
+
+from metasettings.expressions import ConvertedAmount, HistoricalConvertedAmount
+from metasettings.models import CurrencyRate, convert_amount
+
+from .models import Pledge
+
+
+class ConvertedAmountTests(TestCase):
+    def setUp(self):
+        CurrencyRate.objects.invalidate()
+
+        for currency, rate in (("EUR", "0.73"), ("USD", "1.00"), ("GBP", "0.61")):
+            CurrencyRate.objects.create(currency=currency, rate=rate)
+
+        Pledge.objects.create(amount="15.00", currency="EUR")
+        Pledge.objects.create(amount="10.00", currency="USD")
+        Pledge.objects.create(amount="20.00", currency="GBP")
+        Pledge.objects.create(amount="5.00", currency="JPY")
+
+    def tearDown(self):
+        CurrencyRate.objects.invalidate()
+
+    def test_annotate(self):
+        pledges = Pledge.objects.annotate(
+            converted=ConvertedAmount("amount", "currency", to="USD")
+        ).order_by("converted")
+
+        results = [(pledge.currency.code, pledge.converted) for pledge in pledges]
+
+        self.assertEqual(results[0], ("JPY", None))
+
+        for currency, converted in results[1:]:
+            pledge = Pledge.objects.get(currency=currency)
+
+            self.assertAlmostEqual(
+                float(converted),
+                float(convert_amount(currency, "USD", pledge.amount)),
+                places=6,
+            )
+
+        self.assertEqual(
+            [currency for currency, converted in results[1:]], ["USD", "EUR", "GBP"]
+        )
+
+    def test_aggregate_and_filter(self):
+        total = Pledge.objects.aggregate(
+            total=Sum(ConvertedAmount("amount", "currency", to="EUR"))
+        )["total"]
+
+        expected = sum(
+            convert_amount(currency, "EUR", Decimal(amount))
+            for currency, amount in (("EUR", 15), ("USD", 10), ("GBP", 20))
+        )
+
+        self.assertAlmostEqual(float(total), float(expected), places=6)
+
+        pledges = Pledge.objects.annotate(
+            converted=ConvertedAmount("amount", "currency", to="EUR")
+        ).filter(converted__gt=15)
+
+        self.assertEqual(sorted(pledge.currency.code for pledge in pledges), ["GBP"])
+
+
+class HistoricalConvertedAmountTests(TestCase):
+    def setUp(self):
+        CurrencyRate.objects.invalidate()
+
+        for currency, rate, year, month in (
+            ("EUR", "0.73", None, None),
+            ("USD", "1.00", None, None),
+            ("GBP", "0.61", None, None),
+            ("EUR", "0.50", 2013, 10),
+            ("USD", "1.00", 2013, 10),
+            ("GBP", "0.25", 2013, 10),
+            ("EUR", "2.00", 2013, 11),
+            ("USD", "1.00", 2013, 11),
+        ):
+            CurrencyRate.objects.create(
+                currency=currency, rate=rate, year=year, month=month
+            )
+
+        Pledge.objects.create(amount="15.00", currency="EUR", date=date(2013, 10, 3))
+        Pledge.objects.create(amount="10.00", currency="GBP", date=date(2013, 10, 31))
+        Pledge.objects.create(amount="15.00", currency="EUR", date=date(2013, 11, 1))
+        Pledge.objects.create(amount="10.00", currency="GBP", date=date(2013, 11, 2))
+        Pledge.objects.create(amount="15.00", currency="EUR", date=date(2014, 1, 1))
+
+    def tearDown(self):
+        CurrencyRate.objects.invalidate()
+
+    def test_annotate(self):
+        pledges = Pledge.objects.annotate(
+            converted=HistoricalConvertedAmount("amount", "currency", "date", to="USD")
+        ).order_by("date")
+
+        self.assertEqual(
+            ["%.2f" % pledge.converted for pledge in pledges],
+            ["30.00", "40.00", "7.50", "16.39", "20.55"],
+        )
+
+    def test_aggregate(self):
+        with self.assertNumQueries(1):
+            total = Pledge.objects.aggregate(
+                total=Sum(
+                    HistoricalConvertedAmount("amount", "currency", "date", to="EUR")
+                )
+            )["total"]
+
+        expected = (
+            convert_amount("EUR", "EUR", Decimal(15), year=2013, month=10)
+            + convert_amount("GBP", "EUR", Decimal(10), year=2013, month=10)
+            + convert_amount("EUR", "EUR", Decimal(15), year=2013, month=11)
+            # No GBP rate in November, both rates are the default ones
+            + convert_amount("GBP", "EUR", Decimal(10))
+            + convert_amount("EUR", "EUR", Decimal(15), year=2014, month=1)
+        )
+
+        self.assertAlmostEqual(float(total), float(expected), places=6)
@@ -0,0 +1,381 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import os
+import shutil
+import tempfile
+import threading
+
+from mock import Mock, patch
+
+from django.core.cache import caches
+from django.test import TestCase
+from django.test.client import RequestFactory
+
+from metasettings import geoip
+from metasettings.compat import GeoIPException
+from metasettings.geoip import GeoIPReaders, lookup, lookup_many
+from metasettings.helpers import get_network_key, is_public_ip
+from metasettings.models import (
+    Currency,
+    Location,
+    Timezone,
+    get_currency_from_ip_address,
+    get_timezone_from_ip_address,
+)
+
+
+class GeoIPReadersTests(TestCase):
+    def setUp(self):
+        self.readers = GeoIPReaders()
+
+    def test_reader_is_shared(self):
+        with patch("metasettings.compat.GeoIP") as GeoIP:
+            reader = self.readers.get("mmap")
+
+            self.assertIs(self.readers.get("mmap"), reader)
+            self.assertEqual(GeoIP.call_count, 1)
+
+            self.readers.get("memory")
+
+            self.assertEqual(GeoIP.call_count, 2)
+            self.assertIn("memory", self.readers)
+
+    def test_reader_is_shared_between_threads(self):
+        results = []
+
+        with patch("metasettings.compat.GeoIP") as GeoIP:
+            threads = [
+                threading.Thread(target=lambda: results.append(self.readers.get()))
+                for i in range(10)
+            ]
+
+            for thread in threads:
+                thread.start()
+
+            for thread in threads:
+                thread.join()
+
+            self.assertEqual(GeoIP.call_count, 1)
+            self.assertEqual(len(set(map(id, results))), 1)
+
+    def test_invalid_mode(self):
+        with patch("metasettings.compat.GeoIP"):
+            self.assertRaises(ValueError, self.readers.get, "unknown")
+
+    def test_clear(self):
+        with patch("metasettings.compat.GeoIP") as GeoIP:
+            self.readers.get("auto")
+            self.readers.clear()
+            self.readers.get("auto")
+
+            self.assertEqual(GeoIP.call_count, 2)
+
+
+class LookupTests(TestCase):
+    def setUp(self):
+        geoip.resolutions.clear()
+
+    def tearDown(self):
+        geoip.resolutions.clear()
+
+    def test_lookup_is_cached(self):
+        with patch.object(geoip, "get_reader") as get_reader:
+            get_reader.return_value.country_code.return_value = "FR"
+
+            self.assertEqual(lookup("country_code", "78.192.244.8"), "FR")
+            self.assertEqual(lookup("country_code", "78.192.244.8"), "FR")
+
+            self.assertEqual(get_reader.return_value.country_code.call_count, 1)
+            self.assertEqual(geoip.resolutions.info().hits, 1)
+
+    def test_lookup_by_network(self):
+        with patch.object(geoip, "get_reader") as get_reader, patch.object(
+            geoip.settings, "GEOIP_CACHE_IPV4_PREFIX", 24
+        ):
+            get_reader.return_value.country_code.return_value = "FR"
+
+            lookup("country_code", "78.192.244.8")
+            lookup("country_code", "78.192.244.200")
+            lookup("country_code", "78.192.245.8")
+
+            self.assertEqual(get_reader.return_value.country_code.call_count, 2)
+
+    def test_lookup_errors_are_cached(self):
+        with patch.object(geoip, "get_reader") as get_reader:
+            get_reader.return_value.city.side_effect = Exception("not found")
+
+            self.assertIsNone(lookup("city", "78.192.244.8"))
+            self.assertIsNone(lookup("city", "78.192.244.8"))
+
+            self.assertEqual(get_reader.return_value.city.call_count, 1)
+
+    def test_lookup_private_addresses(self):
+        with patch.object(geoip, "get_reader") as get_reader:
+            for ip_address in ("127.0.0.1", "10.0.0.1", "192.168.1.1", "::1", None):
+                self.assertIsNone(lookup("country_code", ip_address))
+
+            self.assertFalse(get_reader.called)
+
+    def test_network_key(self):
+        self.assertEqual(get_network_key("78.192.244.8"), "78.192.244.8")
+        self.assertEqual(get_network_key("78.192.244.8", 24), "78.192.244.0/24")
+        self.assertEqual(
+            get_network_key("2a01:e35:2f1e:1::1", ipv6_prefix=48), "2a01:e35:2f1e::/48"
+        )
+        self.assertEqual(get_network_key("example.com", 24), "example.com")
+        self.assertEqual(get_network_key("::ffff:78.192.244.8", 24), "78.192.244.0/24")
+
+        self.assertTrue(is_public_ip("78.192.244.8"))
+        self.assertFalse(is_public_ip("172.16.0.1"))
+        self.assertTrue(is_public_ip("::ffff:78.192.244.8"))
+        self.assertFalse(is_public_ip("::ffff:172.16.0.1"))
+
+
+class LocationTests(TestCase):
+    def setUp(self):
+        geoip.resolutions.clear()
+
+    def tearDown(self):
+        geoip.resolutions.clear()
+
+    def test_location_from_city(self):
+        with patch.object(geoip, "get_reader") as get_reader:
+            reader = get_reader.return_value
+            reader.city.return_value = {"country_code": "US", "region": "NY"}
+
+            location = Location.from_ip_address("69.197.132.80")
+
+            self.assertEqual(location.country_code, "US")
+            self.assertEqual(location.currency, "USD")
+            self.assertEqual(location.timezone, "America/New_York")
+
+            self.assertEqual(get_currency_from_ip_address("69.197.132.80"), "USD")
+            self.assertEqual(
+                get_timezone_from_ip_address("69.197.132.80"), "America/New_York"
+            )
+
+            self.assertEqual(reader.city.call_count, 1)
+            self.assertFalse(reader.country_code.called)
+
+    def test_location_from_country(self):
+        with patch.object(geoip, "get_reader") as get_reader:
+            reader = get_reader.return_value
+            reader.city.side_effect = GeoIPException("no city database")
+            reader.country_code.return_value = "JP"
+
+            location = Location.from_ip_address("203.152.216.75")
+
+            self.assertEqual(location.currency, "JPY")
+            self.assertEqual(location.timezone, "Asia/Tokyo")
+
+            geoip.resolutions.clear()
+            Location.from_ip_address("203.152.216.75")
+
+            # The missing city database is only detected once
+            self.assertEqual(reader.city.call_count, 1)
+            self.assertEqual(reader.country_code.call_count, 2)
+
+    def test_location_not_found(self):
+        with patch.object(geoip, "get_reader") as get_reader:
+            get_reader.return_value.city.side_effect = Exception("not found")
+
+            location = Location.from_ip_address("203.152.216.75")
+
+            self.assertIsNone(location.country_code)
+            self.assertEqual(location.currency, "EUR")
+            self.assertEqual(location.timezone, "Europe/Paris")
+
+    def test_location_from_request_with_cookies(self):
+        request = RequestFactory().get("/")
+        request.COOKIES = {"django_currency": "USD", "django_timezone": "Asia/Tokyo"}
+
+        with patch.object(geoip, "get_reader") as get_reader:
+            location = Location.from_request(request)
+
+            self.assertEqual(location.currency, "USD")
+            self.assertEqual(location.timezone, "Asia/Tokyo")
+            self.assertFalse(get_reader.called)
+
+
+class BulkLookupTests(TestCase):
+    def test_from_ip_addresses(self):
+        countries = {
+            "78.192.244.8": "FR",
+            "69.197.132.80": "US",
+            "203.152.216.75": "JP",
+        }
+
+        ip_addresses = [
+            "78.192.244.8",
+            "69.197.132.80",
+            "127.0.0.1",
+            "78.192.244.8",
+            "203.152.216.75",
+            "1.1.1.1",
+            "69.197.132.80",
+        ]
+
+        with patch.object(geoip, "get_reader") as get_reader:
+            reader = get_reader.return_value
+            reader.city.side_effect = GeoIPException("no city database")
+            reader.country_code.side_effect = countries.get
+
+            currencies = Currency.from_ip_addresses(iter(ip_addresses))
+
+            self.assertEqual(
+                list(map(str, currencies)),
+                ["EUR", "USD", "EUR", "EUR", "JPY", "EUR", "USD"],
+            )
+            self.assertEqual(reader.country_code.call_count, 4)
+
+            reader.country_code.reset_mock()
+
+            zones = Timezone.from_ip_addresses(ip_addresses)
+
+            self.assertEqual(
+                [zone.code for zone in zones],
+                [
+                    "Europe/Paris",
+                    "Europe/Paris",
+                    "Europe/Paris",
+                    "Europe/Paris",
+                    "Asia/Tokyo",
+                    "Europe/Paris",
+                    "Europe/Paris",
+                ],
+            )
+            self.assertEqual(reader.country_code.call_count, 4)
+
+    def test_lookup_many_chunks(self):
+        with patch.object(geoip, "get_reader") as get_reader:
+            reader = get_reader.return_value
+            reader.country_code.side_effect = lambda ip_address: ip_address[:2]
+
+            ip_addresses = ["78.192.244.%d" % (i % 3) for i in range(30)]
+
+            results = list(lookup_many("country_code", ip_addresses, chunk_size=10))
+
+            self.assertEqual(results, ["78"] * 30)
+
+            # Networks are looked up once per chunk, results are not kept
+            # across chunks
+            self.assertEqual(reader.country_code.call_count, 9)
+
+
+class SharedCacheTests(TestCase):
+    def setUp(self):
+        geoip.resolutions.clear()
+        caches["default"].clear()
+
+    def tearDown(self):
+        geoip.resolutions.clear()
+        caches["default"].clear()
+
+    def test_lookup(self):
+        with patch.object(geoip, "get_reader") as get_reader, patch.object(
+            geoip.settings, "GEOIP_SHARED_CACHE_ALIAS", "default"
+        ), patch.object(geoip.settings, "GEOIP_SHARED_CACHE_VERSION", "1"):
+            get_reader.return_value.country_code.return_value = "FR"
+
+            self.assertEqual(lookup("country_code", "78.192.244.8"), "FR")
+
+            self.assertEqual(
+                caches["default"].get("metasettings:geoip:1:country_code:78.192.244.8"),
+                "FR",
+            )
+
+            geoip.resolutions.clear()
+
+            self.assertEqual(lookup("country_code", "78.192.244.8"), "FR")
+            self.assertEqual(get_reader.return_value.country_code.call_count, 1)
+
+            with patch.object(geoip.settings, "GEOIP_SHARED_CACHE_VERSION", "2"):
+                geoip.resolutions.clear()
+
+                self.assertEqual(lookup("country_code", "78.192.244.8"), "FR")
+                self.assertEqual(get_reader.return_value.country_code.call_count, 2)
+
+    def test_lookup_many(self):
+        with patch.object(geoip, "get_reader") as get_reader, patch.object(
+            geoip.settings, "GEOIP_SHARED_CACHE_ALIAS", "default"
+        ):
+            reader = get_reader.return_value
+            reader.country_code.side_effect = lambda ip_address: ip_address[:2]
+
+            version = geoip.get_database_version(reader)
+
+            caches["default"].set(
+                "metasettings:geoip:{}:country_code:78.192.244.8".format(version),
+                "FR",
+            )
+
+            ip_addresses = ["78.192.244.8", "69.197.132.80", "78.192.244.8"]
+
+            with patch.object(
+                caches["default"], "get_many", wraps=caches["default"].get_many
+            ) as get_many:
+                results = list(lookup_many("country_code", ip_addresses))
+
+                self.assertEqual(get_many.call_count, 1)
+
+            self.assertEqual(results, ["FR", "69", "FR"])
+            self.assertEqual(reader.country_code.call_count, 1)
+            self.assertEqual(
+                caches["default"].get(
+                    "metasettings:geoip:{}:country_code:69.197.132.80".format(version)
+                ),
+                "69",
+            )
+
+    def test_database_version(self):
+        path = tempfile.mkdtemp()
+
+        self.addCleanup(shutil.rmtree, path)
+
+        database = os.path.join(path, "GeoLite2-Country.mmdb")
+
+        with open(database, "wb") as f:
+            f.write(b"2013")
+
+        reader = Mock()
+
+        with self.settings(GEOIP_PATH=path):
+            version = geoip.get_database_version(reader)
+
+            self.assertNotEqual(version, 0)
+
+            with open(database, "wb") as f:
+                f.write(b"2014-01")
+
+            # Readers keep the version of the database they opened
+            self.assertEqual(geoip.get_database_version(reader), version)
+            self.assertNotEqual(geoip.get_database_version(Mock()), version)
+
+        with self.settings(GEOIP_PATH=os.path.join(path, "missing")):
+            with self.assertLogs("django.metasettings", "WARNING"):
+                self.assertEqual(geoip.get_database_version(Mock()), 0)
+
+    def test_unavailable_cache(self):
+        cache = caches["default"]
+
+        with patch.object(geoip, "get_reader") as get_reader, patch.object(
+            geoip.settings, "GEOIP_SHARED_CACHE_ALIAS", "default"
+        ), patch.object(geoip.settings, "GEOIP_SHARED_CACHE_VERSION", "1"):
+            reader = get_reader.return_value
+            reader.country_code.side_effect = lambda ip_address: ip_address[:2]
+
+            with patch.multiple(
+                cache,
+                get=Mock(side_effect=ConnectionError),
+                set=Mock(side_effect=ConnectionError),
+                get_many=Mock(side_effect=ConnectionError),
+                set_many=Mock(side_effect=ConnectionError),
+            ):
+                self.assertEqual(lookup("country_code", "78.192.244.8"), "78")
+                self.assertEqual(
+                    list(lookup_many("country_code", ["69.197.132.80"])), ["69"]
+                )
+
+                self.assertTrue(cache.set.called)
+                self.assertTrue(cache.set_many.called)
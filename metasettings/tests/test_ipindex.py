@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from io import StringIO
+
+from mock import patch
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from metasettings import geoip
+from metasettings.exceptions import InvalidIPIndex
+from metasettings.geoip import GeoIPReaders
+from metasettings.ipindex import IPRangeIndex
+from metasettings.models import Currency, Location
+
+
+CSV = """network,country_code
+78.192.0.0/10,FR
+69.197.128.0/18,US
+203.152.216.0/24,JP
+2a01:e00::/26,FR
+"""
+
+
+class IPRangeIndexTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.csv_path = os.path.join(self.directory, "ranges.csv")
+        self.index_path = os.path.join(self.directory, "ranges.idx")
+
+        with open(self.csv_path, "w") as f:
+            f.write(CSV)
+
+        geoip.resolutions.clear()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+        geoip.resolutions.clear()
+
+    def build(self):
+        call_command(
+            "build_ip_index", self.csv_path, output=self.index_path, stdout=StringIO()
+        )
+
+    def test_lookup(self):
+        self.build()
+
+        for memory in (True, False):
+            index = IPRangeIndex.open(self.index_path, memory=memory)
+
+            self.assertEqual(len(index), 4)
+            self.assertEqual(index.country_code("78.192.244.8"), "FR")
+            self.assertEqual(index.country_code("78.192.0.0"), "FR")
+            self.assertEqual(index.country_code("78.255.255.255"), "FR")
+            self.assertEqual(index.country_code("69.197.132.80"), "US")
+            self.assertEqual(index.country_code("203.152.216.75"), "JP")
+            self.assertEqual(index.country_code("2a01:e35:2f1e:1::1"), "FR")
+            self.assertEqual(index.country_code("::ffff:78.192.244.8"), "FR")
+            self.assertEqual(index.country_code("::ffff:69.197.132.80"), "US")
+            self.assertIsNone(index.country_code("1.1.1.1"))
+            self.assertIsNone(index.country_code("255.255.255.255"))
+            self.assertIsNone(index.country_code("::1"))
+
+            index.close()
+
+    def test_start_end_rows(self):
+        with open(self.csv_path, "w") as f:
+            f.write("1.0.0.0,1.0.0.255,AU\n16777472,16778239,cn\n")
+
+        self.build()
+
+        index = IPRangeIndex.open(self.index_path)
+
+        self.assertEqual(index.country_code("1.0.0.1"), "AU")
+        self.assertEqual(index.country_code("1.0.2.1"), "CN")
+
+    def test_invalid(self):
+        with open(self.csv_path, "w") as f:
+            f.write("1.0.0.0/24,AU\n1.0.0.128/25,CN\n")
+
+        with self.assertRaises(CommandError):
+            self.build()
+
+        self.assertRaises(InvalidIPIndex, IPRangeIndex, b"MSIP")
+
+    def test_reader(self):
+        self.build()
+
+        with patch.object(geoip.settings, "IP_INDEX_PATH", self.index_path):
+            readers = GeoIPReaders()
+
+            self.assertIsInstance(readers.get(), IPRangeIndex)
+
+            with patch.object(geoip, "get_reader", readers.get):
+                location = Location.from_ip_address("203.152.216.75")
+
+                self.assertEqual(location.currency, "JPY")
+                self.assertEqual(location.timezone, "Asia/Tokyo")
+
+    def test_from_ip_addresses_with_processes(self):
+        self.build()
+
+        ip_addresses = ["78.192.244.8", "69.197.132.80", "203.152.216.75"] * 10
+
+        with patch.object(geoip.settings, "IP_INDEX_PATH", self.index_path):
+            geoip.readers.clear()
+
+            try:
+                currencies = Currency.from_ip_addresses(ip_addresses, processes=2)
+
+                self.assertEqual(list(map(str, currencies)), ["EUR", "USD", "JPY"] * 10)
+            finally:
+                geoip.readers.clear()
+
+    def test_from_ip_addresses_with_spawned_processes(self):
+        self.build()
+
+        ip_addresses = ["78.192.244.8", "69.197.132.80", "203.152.216.75"] * 10
+
+        spawn = partial(
+            ProcessPoolExecutor, mp_context=multiprocessing.get_context("spawn")
+        )
+
+        with patch.object(geoip.settings, "IP_INDEX_PATH", self.index_path):
+            with patch.object(geoip, "ProcessPoolExecutor", spawn):
+                geoip.readers.clear()
+
+                try:
+                    locations = list(
+                        Location.from_ip_addresses(ip_addresses, processes=2)
+                    )
+                finally:
+                    geoip.readers.clear()
+
+        self.assertEqual(
+            [location.currency.code for location in locations],
+            ["EUR", "USD", "JPY"] * 10,
+        )
+        self.assertIsNot(locations[0], locations[3])
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from mock import patch
+
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.test import TestCase
+from django.test.client import RequestFactory
+
+from metasettings import geoip, middleware
+from metasettings.middleware import MetasettingsMiddleware
+
+
+class MiddlewareTests(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.middleware = MetasettingsMiddleware(lambda request: HttpResponse())
+
+        geoip.resolutions.clear()
+
+    def tearDown(self):
+        geoip.resolutions.clear()
+
+    def test_lazy_metasettings(self):
+        request = self.factory.get("/", REMOTE_ADDR="69.197.132.80")
+
+        with patch.object(geoip, "get_reader") as get_reader:
+            get_reader.return_value.city.return_value = {
+                "country_code": "US",
+                "region": "NY",
+            }
+
+            self.middleware(request)
+
+            self.assertFalse(get_reader.called)
+
+            t = Template(
+                "{% load metasettings_tags %}"
+                "{% get_currency_from_request request as currency %}"
+                "{% get_timezone_from_request request as timezone %}"
+                "{{ currency }} {{ timezone }}"
+            )
+
+            with patch.object(
+                middleware.Location,
+                "from_request",
+                wraps=middleware.Location.from_request,
+            ) as from_request:
+                result = t.render(Context({"request": request}))
+
+                self.assertEqual(result, "USD America/New_York")
+                self.assertEqual(request.metasettings.currency, "USD")
+                self.assertEqual(from_request.call_count, 1)
+
+            self.assertEqual(get_reader.return_value.city.call_count, 1)
+
+        self.assertEqual(request.metasettings.language, "en")
+
+    def test_skip_user_agents(self):
+        request = self.factory.get(
+            "/", REMOTE_ADDR="69.197.132.80", HTTP_USER_AGENT="Googlebot/2.1"
+        )
+        request.COOKIES = {"django_currency": "USD"}
+
+        with patch.object(geoip, "get_reader") as get_reader:
+            self.middleware(request)
+
+            self.assertEqual(request.metasettings.currency, "USD")
+            self.assertEqual(request.metasettings.timezone, "Europe/Paris")
+            self.assertFalse(get_reader.called)
+
+    def test_skip_paths(self):
+        with patch.object(
+            middleware.settings, "MIDDLEWARE_SKIP_PATHS", [r"^/static/", r"^/health$"]
+        ):
+            self.middleware = MetasettingsMiddleware(lambda request: HttpResponse())
+
+        with patch.object(geoip, "get_reader") as get_reader:
+            for path in ("/static/app.css", "/health"):
+                request = self.factory.get(path, REMOTE_ADDR="69.197.132.80")
+
+                self.middleware(request)
+
+                self.assertEqual(request.metasettings.currency, "EUR")
+
+            self.assertFalse(get_reader.called)
+
+            request = self.factory.get("/healthy", REMOTE_ADDR="69.197.132.80")
+
+            self.middleware(request)
+
+            self.assertTrue(request.metasettings.geoip)
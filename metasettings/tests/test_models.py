@@ -1,7 +1,12 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
+import threading
+
+from datetime import date
+
 from mock import patch
+
 import pytz
 
 from django.test import TestCase
@@ -15,6 +20,7 @@ from metasettings.models import (
     CurrencyRate,
     CurrencyRateManager,
     Timezone,
+    convert_amount,
     get_currency_from_ip_address,
     get_timezone_from_ip_address,
 )
@@ -169,3 +175,142 @@ class ModelTests(TestCase):
         )
 
         self.assertEqual(response.status_code, 302)
+
+    def test_currency_rates_invalidation(self):
+        CurrencyRate.objects.invalidate()
+
+        CurrencyRate.objects.create(currency="EUR", rate="0.50")
+        CurrencyRate.objects.create(currency="USD", rate="1.00")
+
+        self.assertEqual(convert_amount("EUR", "USD", 15), 30)
+
+        version = CurrencyRate.objects.version
+
+        with self.captureOnCommitCallbacks(execute=True):
+            CurrencyRate.objects.update_or_create("EUR", 0.75)
+
+            # Rates are only invalidated once the transaction is committed
+            self.assertEqual(CurrencyRate.objects.version, version)
+            self.assertEqual(convert_amount("EUR", "USD", 15), 30)
+
+        self.assertTrue(CurrencyRate.objects.version > version)
+        self.assertEqual(convert_amount("EUR", "USD", 15), 20)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            CurrencyRate.objects.update_or_create("GBP", 0.6, date(2013, 10, 1))
+
+        self.assertIn("GBP", CurrencyRate.objects.get_currency_rates(2013, 10))
+        self.assertNotIn("GBP", CurrencyRate.objects.get_currency_rates(2013, 11))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            CurrencyRate.objects.filter(currency="GBP").delete()
+
+        self.assertNotIn("GBP", CurrencyRate.objects.get_currency_rates(2013, 10))
+
+        CurrencyRate.objects.invalidate()
+
+    def test_currency_rates_by_period(self):
+        CurrencyRate.objects.invalidate()
+
+        CurrencyRate.objects.create(currency="EUR", rate="0.50")
+        CurrencyRate.objects.create(currency="EUR", rate="0.70", year=2013, month=10)
+        CurrencyRate.objects.create(currency="EUR", rate="0.80", year=2013, month=11)
+
+        with self.assertNumQueries(1):
+            rates = CurrencyRate.objects.get_currency_rates(2013, 10)
+            rates = CurrencyRate.objects.get_currency_rates(2013, 10)
+
+        self.assertEqual(str(rates["EUR"].rate), "0.70")
+
+        with self.assertNumQueries(2):
+            rates = CurrencyRate.objects.get_currency_rates(2012, 1)
+
+        self.assertEqual(str(rates["EUR"].rate), "0.50")
+
+        with self.assertNumQueries(0):
+            CurrencyRate.objects.get_currency_rates(2012, 1)
+            CurrencyRate.objects.get_currency_rates()
+
+        self.assertEqual(CurrencyRate.objects.periods.info().currsize, 3)
+
+        with self.assertNumQueries(0):
+            CurrencyRate.objects.get_currency_rates(2013, 10)
+
+        with patch.object(CurrencyRate.objects.periods, "maxsize", 2):
+            CurrencyRate.objects.get_currency_rates(2013, 11)
+
+            self.assertEqual(len(CurrencyRate.objects.periods), 2)
+
+        self.assertEqual(sorted(CurrencyRate.objects.rates[2013]), [10, 11])
+
+        CurrencyRate.objects.invalidate()
+
+    def test_invalidation_while_storing(self):
+        CurrencyRate.objects.invalidate()
+
+        CurrencyRate.objects.create(currency="EUR", rate="0.50")
+
+        periods = CurrencyRate.objects.periods
+        threads = []
+
+        def store(key, value, store=periods.set):
+            # Another thread invalidates rates right after they are checked
+            thread = threading.Thread(target=CurrencyRate.objects.invalidate)
+            thread.start()
+            thread.join(0.1)
+            threads.append(thread)
+
+            store(key, value)
+
+        with patch.object(periods, "set", store):
+            CurrencyRate.objects.get_currency_rates()
+
+        threads[0].join()
+
+        # The invalidation waits for the rates to be stored, then drops them
+        self.assertEqual(periods.info().currsize, 0)
+
+        CurrencyRate.objects.invalidate()
+
+    def test_sync_currency_rates(self):
+        CurrencyRate.objects.invalidate()
+
+        CurrencyRate.objects.create(currency="EUR", rate="0.50", year=2013, month=10)
+        CurrencyRate.objects.create(currency="USD", rate="1.00", year=2013, month=10)
+        CurrencyRate.objects.create(currency="USD", rate="1.00")
+
+        self.assertEqual(convert_amount("EUR", "USD", 15, year=2013, month=10), 30)
+
+        version = CurrencyRate.objects.version
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertNumQueries(5):
+                results = CurrencyRate.objects.sync(
+                    {"EUR": 0.75, "USD": 1.001, "GBP": 0.6}, date(2013, 10, 1)
+                )
+
+            # Loaded rates are kept until the transaction is committed
+            self.assertEqual(CurrencyRate.objects.version, version)
+
+        self.assertEqual(
+            results, {"created": ["GBP"], "updated": ["EUR"], "unchanged": ["USD"]}
+        )
+        self.assertTrue(CurrencyRate.objects.version > version)
+        self.assertEqual(convert_amount("EUR", "USD", 15, year=2013, month=10), 20)
+
+        rates = CurrencyRate.objects.filter(year=2013, month=10)
+
+        self.assertEqual(
+            dict((rate.currency, str(rate.rate)) for rate in rates),
+            {"EUR": "0.75", "USD": "1.00", "GBP": "0.60"},
+        )
+
+        version = CurrencyRate.objects.version
+
+        with self.assertNumQueries(1):
+            results = CurrencyRate.objects.sync({"USD": 1})
+
+        self.assertEqual(results, {"created": [], "updated": [], "unchanged": ["USD"]})
+        self.assertEqual(CurrencyRate.objects.version, version)
+
+        CurrencyRate.objects.invalidate()
@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from mock import patch
+
+from django.core.cache import caches
+from django.test import TestCase
+
+from metasettings import openexchangerates, settings
+from metasettings.models import CurrencyRate
+from metasettings.openexchangerates import (
+    fetch_rates,
+    get_session,
+    rate_request,
+    sync_rates,
+)
+from metasettings.store import PayloadStore
+
+
+class LatestHandler(BaseHTTPRequestHandler):
+    """Serve `/latest.json` with an `ETag`, answering 304 to requests
+    carrying it and failing the requests listed in `server.failures`.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.server.requests.append(dict(self.headers))
+
+        if self.server.failures:
+            self.send_response(self.server.failures.pop(0))
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+            return
+
+        etag = '"%s"' % self.server.version
+
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+            return
+
+        body = json.dumps(
+            self.server.payload
+            or {"rates": {"EUR": 0.5 + self.server.version / 10.0, "USD": 1}}
+        ).encode()
+
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class RateRequestTests(TestCase):
+    def setUp(self):
+        CurrencyRate.objects.invalidate()
+        caches["default"].clear()
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), LatestHandler)
+        server.requests = []
+        server.failures = []
+        server.version = 1
+        server.payload = None
+
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+
+        def stop():
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+        self.addCleanup(stop)
+
+        self.server = server
+
+        patcher = patch.multiple(
+            openexchangerates.settings,
+            OPENEXCHANGERATES_URL="http://127.0.0.1:%d" % server.server_address[1],
+            OPENEXCHANGERATES_BACKOFF=0,
+            OPENEXCHANGERATES_CACHE_ALIAS="default",
+        )
+        patcher.start()
+
+        self.addCleanup(patcher.stop)
+
+        # Sessions are built from the patched settings
+        openexchangerates._sessions.clear()
+
+        self.addCleanup(openexchangerates._sessions.clear)
+
+    def tearDown(self):
+        CurrencyRate.objects.invalidate()
+        caches["default"].clear()
+
+    def test_session_is_shared(self):
+        self.assertIs(get_session(), get_session())
+        self.assertIs(get_session(), get_session(settings.RATES_SYNC_WORKERS))
+        self.assertIsNot(get_session(16), get_session())
+
+        adapter = get_session(16).get_adapter("https://openexchangerates.org")
+
+        self.assertEqual(adapter._pool_maxsize, 16)
+
+    def test_fetch_rates_session(self):
+        sessions = []
+
+        def request(app_id, date=None, session=None):
+            sessions.append(session)
+
+        dates = [date(2013, 1, 1), date(2013, 2, 1)]
+
+        with patch.object(openexchangerates, "rate_request", request):
+            list(fetch_rates("app", dates, workers=8))
+
+        self.assertEqual(sessions, [get_session(8), get_session(8)])
+
+    def test_not_modified(self):
+        results = sync_rates("app")
+
+        self.assertEqual(sorted(results["created"]), ["EUR", "USD"])
+        self.assertNotIn("If-None-Match", self.server.requests[0])
+
+        with self.assertNumQueries(0):
+            self.assertIsNone(sync_rates("app"))
+
+        self.assertEqual(self.server.requests[1]["If-None-Match"], '"1"')
+
+        self.server.version = 2
+
+        results = sync_rates("app")
+
+        self.assertEqual(results["updated"], ["EUR"])
+        self.assertEqual(
+            str(CurrencyRate.objects.get(currency="EUR", year__isnull=True).rate),
+            "0.70",
+        )
+
+    def test_without_validators_cache(self):
+        with patch.object(
+            openexchangerates.settings, "OPENEXCHANGERATES_CACHE_ALIAS", None
+        ):
+            sync_rates("app")
+            sync_rates("app")
+
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertNotIn("If-None-Match", self.server.requests[1])
+
+        key = openexchangerates.get_validators_key(
+            openexchangerates.settings.OPENEXCHANGERATES_URL + "/latest.json"
+        )
+
+        self.assertIsNone(caches["default"].get(key))
+
+    def test_validators_are_dropped_on_failed_writes(self):
+        with patch.object(CurrencyRate.objects, "sync", side_effect=ValueError):
+            self.assertRaises(ValueError, sync_rates, "app")
+
+        sync_rates("app")
+
+        self.assertNotIn("If-None-Match", self.server.requests[1])
+        self.assertEqual(CurrencyRate.objects.count(), 2)
+
+    def test_retries(self):
+        self.server.failures = [503, 502]
+
+        self.assertEqual(rate_request("app")["rates"]["USD"], 1)
+        self.assertEqual(len(self.server.requests), 3)
+
+        self.server.failures = [404]
+
+        self.assertIsNone(rate_request("app"))
+        self.assertEqual(len(self.server.requests), 4)
+
+    def test_missing_rates(self):
+        self.server.payload = {"error": True, "status": 429}
+
+        with patch.object(openexchangerates.LOGGER, "warning") as warning:
+            self.assertIsNone(rate_request("app"))
+            self.assertIsNone(sync_rates("app"))
+
+        self.assertEqual(warning.call_count, 2)
+        self.assertNotIn("If-None-Match", self.server.requests[1])
+        self.assertEqual(CurrencyRate.objects.count(), 0)
+
+    def test_fetch_rates_malformed_response(self):
+        dates = [date(2013, 1, 1), date(2013, 2, 1)]
+
+        def request(app_id, date=None, session=None):
+            if date.month == 1:
+                raise ValueError("Expecting value: line 1 column 1 (char 0)")
+
+            return {"rates": {"USD": 1}}
+
+        with patch.object(openexchangerates, "rate_request", request):
+            results = list(fetch_rates("app", dates))
+
+        self.assertEqual(results, [(dates[0], None), (dates[1], {"rates": {"USD": 1}})])
+
+    def test_payload_store(self):
+        path = tempfile.mkdtemp()
+
+        self.addCleanup(shutil.rmtree, path)
+
+        store = PayloadStore(path)
+        store.set("historical", date(2013, 1, 1), {"rates": {"EUR": 0.73}})
+
+        self.assertEqual(
+            os.listdir(os.path.join(path, "historical")), ["2013-01-01.json.gz"]
+        )
+
+        # The gzip trailer is written before the file is renamed
+        with open(store.get_path("historical", date(2013, 1, 1)), "rb") as f:
+            self.assertEqual(
+                json.loads(gzip.decompress(f.read())), {"rates": {"EUR": 0.73}}
+            )
+
+        self.assertEqual(
+            store.get("historical", date(2013, 1, 1)), {"rates": {"EUR": 0.73}}
+        )
+        self.assertIsNone(store.get("historical", date(2013, 1, 2)))
+
+    def test_historical_store(self):
+        path = tempfile.mkdtemp()
+
+        self.addCleanup(shutil.rmtree, path)
+
+        store = PayloadStore(path)
+
+        with patch.object(
+            openexchangerates.settings, "OPENEXCHANGERATES_STORE_PATH", path
+        ):
+            result = rate_request("app", date(2013, 1, 1))
+
+            self.assertEqual(store.get("historical", date(2013, 1, 1)), result)
+            self.assertTrue(
+                os.path.exists(os.path.join(path, "historical", "2013-01-01.json.gz"))
+            )
+
+            self.server.version = 2
+
+            self.assertEqual(rate_request("app", date(2013, 1, 1)), result)
+            self.assertEqual(len(self.server.requests), 1)
+
+            sync_rates("app", date(2013, 1, 1))
+
+            self.assertEqual(len(self.server.requests), 1)
+            self.assertEqual(CurrencyRate.objects.filter(year=2013).count(), 2)
+
+            # Rates of today may still change
+            today = date.today()
+
+            rate_request("app", today)
+            rate_request("app", today)
+
+            self.assertEqual(len(self.server.requests), 3)
+            self.assertIsNone(store.get("historical", today))
+
+            rate_request("app", today - timedelta(days=1))
+
+            self.assertIsNotNone(store.get("historical", today - timedelta(days=1)))
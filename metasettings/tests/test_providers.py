@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import json
+import os
+import shutil
+import tempfile
+
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+
+from mock import patch
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from metasettings import openexchangerates
+from metasettings.models import CurrencyRate
+from metasettings.providers import (
+    FakeProvider,
+    FileProvider,
+    get_provider,
+    sync,
+    sync_many,
+)
+
+
+class ProvidersTests(TestCase):
+    def setUp(self):
+        CurrencyRate.objects.invalidate()
+
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        CurrencyRate.objects.invalidate()
+
+        shutil.rmtree(self.path)
+
+    def write(self, name, content):
+        path = os.path.join(self.path, name)
+
+        with open(path, "w") as f:
+            f.write(content)
+
+        return path
+
+    def test_csv_file_provider(self):
+        provider = FileProvider(
+            self.write(
+                "rates.csv",
+                "date,currency,rate\n"
+                ",EUR,0.92\n"
+                ",USD,1\n"
+                "# comment\n"
+                "2013-10-01,EUR,0.73\n"
+                "2013-10-01,USD,1\n",
+            )
+        )
+
+        self.assertEqual(provider.latest(), {"EUR": Decimal("0.92"), "USD": 1})
+        self.assertEqual(
+            provider.historical(date(2013, 10, 1)), {"EUR": Decimal("0.73"), "USD": 1}
+        )
+        self.assertIsNone(provider.historical(date(2013, 11, 1)))
+
+        invalid = FileProvider(self.write("invalid.csv", ",EUR,0.92\n,USD,one\n"))
+
+        self.assertRaises(ValueError, invalid.latest)
+
+    def test_json_file_provider(self):
+        provider = FileProvider(
+            self.write(
+                "rates.json",
+                json.dumps(
+                    {
+                        "latest": {"EUR": 0.92, "USD": 1},
+                        "historical": {"2013-10-01": {"EUR": 0.73, "USD": 1}},
+                    }
+                ),
+            )
+        )
+
+        self.assertEqual(provider.latest()["EUR"], Decimal("0.92"))
+
+        self.assertEqual(
+            list(provider.fetch_many([date(2013, 10, 1), date(2013, 11, 1)])),
+            [
+                (date(2013, 10, 1), {"EUR": Decimal("0.73"), "USD": 1}),
+                (date(2013, 11, 1), None),
+            ],
+        )
+
+        self.assertEqual(
+            sync(provider), {"created": ["EUR", "USD"], "updated": [], "unchanged": []}
+        )
+
+    def test_fake_provider(self):
+        provider = FakeProvider()
+
+        dates = [date(2013, month, 1) for month in range(1, 13)]
+
+        self.assertEqual(provider.historical(dates[0]), provider.generate(dates[0]))
+        self.assertNotEqual(provider.generate(dates[0]), provider.generate(dates[1]))
+
+        results = list(sync_many(provider, dates, batch_size=5))
+
+        self.assertEqual([current for current, result in results], dates)
+        self.assertEqual(provider.requests, [dates[0]] + dates)
+        self.assertEqual(
+            CurrencyRate.objects.filter(year=2013).count(),
+            12 * len(provider.generate()),
+        )
+
+        provider = FakeProvider(rates={"EUR": 0.5, "USD": 1}, historical={})
+
+        self.assertEqual(
+            list(sync_many(provider, dates[:2])), [(dates[0], None), (dates[1], None)]
+        )
+        self.assertEqual(sync(provider)["created"], ["EUR", "USD"])
+
+    def test_get_provider(self):
+        with patch.object(
+            openexchangerates.django_settings, "OPENEXCHANGERATES_APP_ID", None
+        ):
+            self.assertRaises(ValueError, get_provider)
+
+        provider = get_provider(app_id="app", workers=2)
+
+        self.assertEqual((provider.app_id, provider.workers), ("app", 2))
+
+        provider = get_provider("metasettings.providers.FakeProvider", rates={})
+
+        self.assertIsInstance(provider, FakeProvider)
+
+    def test_command(self):
+        path = self.write(
+            "rates.csv",
+            "2013-10-01,EUR,0.73\n2013-10-01,USD,1\n2013-11-01,EUR,0.74\n",
+        )
+
+        stdout, stderr = StringIO(), StringIO()
+
+        call_command(
+            "sync_rates",
+            provider="metasettings.providers.FileProvider",
+            path=path,
+            date_start="2013-10-01",
+            date_end="2013-12-01",
+            stdout=stdout,
+            stderr=stderr,
+        )
+
+        self.assertEqual(
+            stdout.getvalue().splitlines(),
+            [
+                "2013-10: 2 created, 0 updated, 0 unchanged",
+                "2013-11: 1 created, 0 updated, 0 unchanged",
+            ],
+        )
+        self.assertEqual(stderr.getvalue().splitlines(), ["2013-12: failed"])
+
+        with self.assertRaises(CommandError):
+            call_command(
+                "sync_rates",
+                provider="metasettings.providers.FileProvider",
+                path=path,
+                workers=2,
+            )
@@ -0,0 +1,427 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import random
+import threading
+
+from unittest import skipUnless
+
+from datetime import date
+from decimal import ROUND_HALF_UP, Decimal
+
+from mock import patch
+
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.test import TestCase
+from django.test.client import RequestFactory
+
+from metasettings import settings
+from metasettings.middleware import MetasettingsMiddleware
+from metasettings.models import (
+    CurrencyRate,
+    Currency,
+    Money,
+    convert_amount,
+    convert_amounts,
+)
+from metasettings.providers import FakeProvider, sync_many
+from metasettings.rates import RateIndex, RateTable, quantize
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+RATES = {"EUR": "0.73", "USD": "1.00", "GBP": "0.61", "JPY": "98.35", "XAU": "0.01"}
+
+
+class RateTableTests(TestCase):
+    def setUp(self):
+        CurrencyRate.objects.invalidate()
+
+        for currency, rate in RATES.items():
+            CurrencyRate.objects.create(currency=currency, rate=rate)
+
+    def tearDown(self):
+        CurrencyRate.objects.invalidate()
+
+    def test_rate_table(self):
+        table = CurrencyRate.objects.get_rate_table()
+
+        self.assertIsInstance(table, RateTable)
+        self.assertEqual(set(table), set(RATES))
+        self.assertEqual(table["EUR"].rate, Decimal("0.73"))
+        self.assertEqual(len(table.factors), 4)
+        self.assertNotIn("XAU", table.ordinals)
+
+        for from_currency in RATES:
+            for to_currency in RATES:
+                for amount in (1, 15, Decimal("1234.56")):
+                    expected = (amount / Decimal(RATES[from_currency])) * Decimal(
+                        RATES[to_currency]
+                    )
+
+                    self.assertEqual(
+                        "%.6f" % table.convert(from_currency, to_currency, amount),
+                        "%.6f" % expected,
+                    )
+
+    def test_rounding(self):
+        generator = random.Random(0)
+
+        rates = dict(
+            (currency, Decimal(generator.randint(1, 10**9)) / 10**4)
+            for currency in RATES
+        )
+
+        table = RateTable(
+            (currency, CurrencyRate(currency=currency, rate=rate))
+            for currency, rate in rates.items()
+        )
+
+        cent = Decimal("0.01")
+
+        for i in range(1000):
+            from_currency, to_currency = generator.sample(sorted(rates), 2)
+            amount = Decimal(generator.randint(1, 10**8)) / 100
+
+            expected = amount / rates[from_currency] * rates[to_currency]
+            result = table.convert(from_currency, to_currency, amount)
+
+            self.assertLess(abs(result - expected) / expected, Decimal("1e-26"))
+            self.assertEqual(
+                result.quantize(cent, ROUND_HALF_UP),
+                expected.quantize(cent, ROUND_HALF_UP),
+            )
+
+    def test_pinned_table(self):
+        table = CurrencyRate.objects.get_rate_table()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            CurrencyRate.objects.update_or_create("EUR", 0.5)
+
+        self.assertEqual(convert_amount("EUR", "USD", 15), 30)
+        self.assertEqual(
+            "%.2f" % convert_amount("EUR", "USD", 15, rates=table), "20.55"
+        )
+        self.assertEqual(Money(15, "EUR").to("USD", ceil=True, rates=table).amount, 21)
+
+    def test_shared_between_threads(self):
+        table = CurrencyRate.objects.get_rate_table()
+        results = []
+
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(table.convert("EUR", "GBP", 100))
+            )
+            for i in range(5)
+        ]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(set(results)), 1)
+
+    def test_templatetags(self):
+        request = RequestFactory().get("/")
+
+        MetasettingsMiddleware(lambda request: HttpResponse())(request)
+
+        t = Template(
+            "{% load metasettings_tags %}{% convert_amount 'EUR' 'USD' 15 ceil=1 %}"
+        )
+
+        self.assertEqual(t.render(Context({"request": request})), "21")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            CurrencyRate.objects.update_or_create("EUR", 0.5)
+
+        self.assertEqual(t.render(Context({"request": request})), "21")
+
+        t = Template(
+            "{% load metasettings_tags %}"
+            "{% convert_amount 'EUR' 'USD' 15 ceil=1 rates=rates %}"
+        )
+
+        self.assertEqual(
+            t.render(Context({"rates": CurrencyRate.objects.get_rate_table()})), "30"
+        )
+
+
+class ConvertAmountsTests(TestCase):
+    def setUp(self):
+        CurrencyRate.objects.invalidate()
+
+        for currency, rate in RATES.items():
+            CurrencyRate.objects.create(currency=currency, rate=rate)
+
+    def tearDown(self):
+        CurrencyRate.objects.invalidate()
+
+    def test_convert_amounts(self):
+        currencies = ["EUR", "USD", "GBP", "EUR", "JPY", "XAU", "USD"]
+        amounts = [15, Decimal("10.5"), 7, 1, 1000, 2, 3]
+
+        for ceil in (False, True):
+            with self.assertNumQueries(1):
+                results = convert_amounts(currencies, "USD", amounts, ceil=ceil)
+
+            self.assertEqual(
+                results,
+                [
+                    convert_amount(currency, "USD", amount, ceil=ceil)
+                    for currency, amount in zip(currencies, amounts)
+                ],
+            )
+
+            CurrencyRate.objects.invalidate()
+
+        self.assertEqual(
+            convert_amounts("EUR", "GBP", iter([15, 30]), ceil=True), [13, 26]
+        )
+        self.assertEqual(
+            convert_amounts(Currency("EUR"), "GBP", [15, 30]),
+            convert_amounts("EUR", "GBP", [15, 30]),
+        )
+
+    @skipUnless(numpy is not None, "NumPy is not installed")
+    def test_convert_amounts_numpy(self):
+        currencies = numpy.array(["EUR", "USD", "GBP", "EUR"])
+        amounts = numpy.array([1500, 1050, 700, 100])
+
+        results = convert_amounts(currencies, "USD", amounts)
+
+        expected = [
+            float(convert_amount(currency, "USD", int(amount)))
+            for currency, amount in zip(currencies.tolist(), amounts.tolist())
+        ]
+
+        self.assertTrue(numpy.allclose(results, expected))
+
+        results = convert_amounts("EUR", "USD", amounts, ceil=True)
+
+        self.assertEqual(results.tolist(), [2055.0, 1439.0, 959.0, 137.0])
+
+
+class RateIndexTests(TestCase):
+    def setUp(self):
+        CurrencyRate.objects.invalidate()
+
+        CurrencyRate.objects.create(currency="EUR", rate="0.50")
+        CurrencyRate.objects.create(currency="USD", rate="1.00")
+        CurrencyRate.objects.create(currency="EUR", rate="0.70", year=2013, month=10)
+        CurrencyRate.objects.create(
+            currency="EUR", rate="0.80", year=2013, month=10, day=1
+        )
+        CurrencyRate.objects.create(
+            currency="EUR", rate="0.75", year=2013, month=10, day=15
+        )
+        CurrencyRate.objects.create(currency="EUR", rate="0.60", year=2013, month=12)
+
+    def tearDown(self):
+        CurrencyRate.objects.invalidate()
+
+    def test_rate_index(self):
+        index = RateIndex(
+            [
+                (date(2013, 10, 1), "EUR", "0.70"),
+                (date(2013, 10, 15), "EUR", "0.75"),
+                (date(2013, 10, 1), "EUR", "0.80"),
+                (date(2013, 11, 3), "GBP", "0.60"),
+            ]
+        )
+
+        self.assertEqual(len(index), 3)
+        self.assertIsNone(index.rate_at("EUR", date(2013, 9, 30)))
+        self.assertEqual(index.rate_at("EUR", date(2013, 10, 1)), Decimal("0.80"))
+        self.assertEqual(index.rate_at("EUR", date(2013, 10, 14)), Decimal("0.80"))
+        self.assertEqual(index.rate_at("EUR", date(2014, 1, 1)), Decimal("0.75"))
+        self.assertIsNone(index.rate_at("USD", date(2014, 1, 1)))
+
+        self.assertEqual(
+            index.rates_at(date(2013, 11, 3)),
+            {"EUR": Decimal("0.75"), "GBP": Decimal("0.60")},
+        )
+        self.assertIsNone(index.effective_date(date(2013, 9, 30)))
+        self.assertEqual(index.effective_date(date(2013, 11, 2)), date(2013, 10, 15))
+
+    def test_convert_at(self):
+        with self.assertNumQueries(2):
+            self.assertEqual(convert_amount("EUR", "USD", 15, at=date(2013, 9, 1)), 30)
+            self.assertEqual(
+                convert_amount("USD", "EUR", 10, at=date(2013, 10, 14)),
+                Decimal("8.00"),
+            )
+
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                convert_amount("USD", "EUR", 10, at=date(2013, 10, 2)),
+                Decimal("8.00"),
+            )
+            self.assertEqual(
+                Money(10, "USD").to("EUR", at=date(2013, 11, 30)).amount,
+                Decimal("7.50"),
+            )
+
+        # Rates of another year are loaded in their own index, which holds
+        # the latest rate of each currency before it
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                Money(10, "USD").to("EUR", at=date(2014, 1, 1)).amount,
+                Decimal("6.00"),
+            )
+
+        self.assertEqual(len(CurrencyRate.objects.get_rate_index(2014)), 1)
+        self.assertEqual(len(CurrencyRate.objects.get_rate_index(2013)), 3)
+
+        self.assertIs(
+            CurrencyRate.objects.get_rates_at(date(2013, 10, 20)),
+            CurrencyRate.objects.get_rates_at(date(2013, 11, 30)),
+        )
+
+        # Monthly periods ignore daily rates
+        rates = CurrencyRate.objects.get_currency_rates(2013, 10)
+
+        self.assertEqual(rates["EUR"].rate, Decimal("0.70"))
+
+    def test_convert_amounts_at(self):
+        dates = [
+            date(2013, 9, 1),
+            date(2013, 10, 2),
+            date(2013, 10, 20),
+            date(2013, 10, 3),
+            date(2014, 1, 1),
+        ]
+
+        # Default rates, then an index per year
+        with self.assertNumQueries(3):
+            results = convert_amounts("USD", "EUR", [10] * 5, at=dates)
+
+        self.assertEqual(
+            results, [Decimal(value) for value in ("5", "8", "7.5", "8", "6")]
+        )
+        self.assertEqual(
+            convert_amounts(["USD", "EUR"], "USD", [10, 8], at=dates[1:3]),
+            [10, Decimal("10.66666666666666666666666667")],
+        )
+
+    @skipUnless(numpy is not None, "numpy is not installed")
+    def test_convert_amounts_at_numpy(self):
+        results = convert_amounts(
+            numpy.array(["USD", "EUR"]),
+            "USD",
+            numpy.array([1000, 800]),
+            at=[date(2013, 10, 2), date(2013, 10, 20)],
+            ceil=True,
+        )
+
+        self.assertEqual(results.tolist(), [1000, 1067])
+
+    def test_sync_daily(self):
+        dates = [date(2013, 11, day) for day in range(1, 4)]
+
+        results = list(sync_many(FakeProvider(), dates, daily=True))
+
+        self.assertEqual([current for current, result in results], dates)
+        self.assertEqual(
+            CurrencyRate.objects.filter(year=2013, month=11, day__isnull=False)
+            .values("day")
+            .distinct()
+            .count(),
+            3,
+        )
+        self.assertEqual(
+            CurrencyRate.objects.filter(year=2013, month=11, day__isnull=True).count(),
+            0,
+        )
+
+        rate = CurrencyRate.objects.get(currency="JPY", year=2013, month=11, day=2)
+
+        self.assertEqual(
+            CurrencyRate.objects.get_rates_at(date(2013, 11, 2))["JPY"].rate, rate.rate
+        )
+
+
+class QuantizeTests(TestCase):
+    def setUp(self):
+        CurrencyRate.objects.invalidate()
+
+        self.table = RateTable(
+            (currency, CurrencyRate(currency=currency, rate=rate))
+            for currency, rate in RATES.items()
+        )
+
+    def tearDown(self):
+        CurrencyRate.objects.invalidate()
+
+    def test_factors_match_formula(self):
+        """Converting with a memoised factor then rounding to the cent gives
+        the result of dividing then multiplying by both rates rounded the same
+        way, unrounded results being equal to 25 significant digits.
+        """
+        amounts = [Decimal(i) / 100 for i in range(0, 10**7, 9973)]
+        amounts += [Decimal("0.01"), Decimal("999999999.99"), 15, 10**9]
+
+        for from_currency in RATES:
+            for to_currency in RATES:
+                if from_currency == to_currency:
+                    continue
+
+                from_rate = Decimal(RATES[from_currency])
+                to_rate = Decimal(RATES[to_currency])
+
+                for amount in amounts:
+                    expected = (amount / from_rate) * to_rate
+
+                    result = convert_amount(
+                        from_currency, to_currency, amount, rates=self.table
+                    )
+
+                    self.assertEqual(
+                        quantize(result, "0.01"), quantize(expected, "0.01")
+                    )
+
+                    if expected:
+                        self.assertTrue(
+                            abs(result - expected) / expected < Decimal("1e-25")
+                        )
+
+    def test_factors_are_memoised(self):
+        factor = self.table.factor("XAU", "EUR")
+
+        self.assertEqual(factor, Decimal(73))
+        self.assertIs(self.table.factor("XAU", "EUR"), factor)
+
+    def test_quantize(self):
+        self.assertEqual(
+            convert_amount("EUR", "GBP", 15, rates=self.table),
+            Decimal("12.53424657534246575342465753"),
+        )
+
+        with patch.object(settings, "RATES_QUANTIZE", "0.01"):
+            self.assertEqual(
+                str(convert_amount("EUR", "GBP", 15, rates=self.table)), "12.53"
+            )
+            self.assertEqual(
+                convert_amount("EUR", "GBP", 15, ceil=True, rates=self.table), 13
+            )
+            self.assertEqual(
+                convert_amounts(["EUR", "USD"], "GBP", [15, 1], rates=self.table),
+                [Decimal("12.53"), Decimal("0.61")],
+            )
+            self.assertEqual(
+                str(Money(15, "EUR").to("GBP", rates=self.table).amount), "12.53"
+            )
+
+            with patch.object(settings, "RATES_ROUNDING", "ROUND_UP"):
+                self.assertEqual(
+                    str(convert_amount("EUR", "GBP", 15, rates=self.table)), "12.54"
+                )
+
+        self.assertEqual(quantize(Decimal("2.675"), "0.01"), Decimal("2.68"))
+        self.assertEqual(quantize(Decimal("2.665"), "0.01"), Decimal("2.66"))
+        self.assertEqual(quantize(1.5, "0.01"), 1.5)
@@ -0,0 +1,317 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+
+from mock import patch
+
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import TestCase
+
+from metasettings import settings
+from metasettings.exceptions import InvalidRateSnapshot
+from metasettings.models import CurrencyRate, convert_amount
+from metasettings.providers import FakeProvider, sync
+from metasettings.snapshot import (
+    COUNTER_KEY,
+    GENERATION_KEY,
+    RateSnapshot,
+    SharedSnapshot,
+    SnapshotFile,
+    build,
+    next_generation,
+    publish,
+    read_generation,
+    write,
+)
+
+
+PERIODS = {
+    (None, None): {"EUR": Decimal("0.50"), "USD": 1},
+    (2013, 10): {"EUR": 0.73, "GBP": Decimal("0.6")},
+}
+
+
+class RateSnapshotTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "rates.bin")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_build(self):
+        snapshot = RateSnapshot(build(PERIODS, generation=3))
+
+        self.assertEqual(snapshot.generation, 3)
+        self.assertEqual(snapshot.currencies, ["EUR", "GBP", "USD"])
+        self.assertEqual(len(snapshot), 2)
+        self.assertIn((2013, 10), snapshot)
+
+        self.assertEqual(
+            snapshot.get_rates(), {"EUR": Decimal("0.50"), "USD": Decimal("1.00")}
+        )
+        self.assertEqual(
+            snapshot.get_rates(2013, 10),
+            {"EUR": Decimal("0.73"), "GBP": Decimal("0.60")},
+        )
+        self.assertEqual(str(snapshot.get_rates(2013, 10)["EUR"]), "0.73")
+        self.assertIsNone(snapshot.get_rates(2013, 11))
+
+    def test_invalid(self):
+        data = build(PERIODS)
+
+        self.assertRaises(InvalidRateSnapshot, RateSnapshot, b"")
+        self.assertRaises(InvalidRateSnapshot, RateSnapshot, b"X" + data[1:])
+        self.assertRaises(InvalidRateSnapshot, RateSnapshot, data[:-1])
+        self.assertRaises(InvalidRateSnapshot, build, {(None, None): {"EURO": 1}})
+
+    def test_write(self):
+        self.assertEqual(read_generation(self.path), 0)
+
+        generation = write(PERIODS, self.path)
+
+        self.assertGreater(write(PERIODS, self.path), generation)
+        self.assertEqual(os.listdir(self.directory), ["rates.bin"])
+
+        snapshot = RateSnapshot.open(self.path)
+
+        self.assertEqual(snapshot.generation, read_generation(self.path))
+        self.assertEqual(snapshot.get_rates()["EUR"], Decimal("0.50"))
+
+        snapshot.close()
+
+    def test_snapshot_file(self):
+        snapshot_file = SnapshotFile(self.path, interval=0)
+
+        self.assertIsNone(snapshot_file.get())
+
+        write(PERIODS, self.path)
+
+        snapshot = snapshot_file.get()
+
+        self.assertEqual(snapshot.generation, read_generation(self.path))
+        self.assertIs(snapshot_file.get(), snapshot)
+
+        generation = write({(None, None): {"EUR": 2}}, self.path)
+
+        self.assertEqual(snapshot_file.get().generation, generation)
+        self.assertEqual(snapshot_file.get().get_rates(), {"EUR": Decimal("2.00")})
+
+        # The previous generation is still readable
+        self.assertEqual(snapshot.get_rates()["EUR"], Decimal("0.50"))
+
+        snapshot_file.interval = 60
+
+        write(PERIODS, self.path)
+
+        self.assertEqual(snapshot_file.get().generation, generation)
+
+    def test_generations_ahead_of_time(self):
+        generation = time.time_ns() // 1000 + 10**9
+
+        with open(self.path, "wb") as f:
+            f.write(build(PERIODS, generation=generation))
+
+        self.assertEqual(write(PERIODS, self.path), generation + 1)
+
+
+class ManagerSnapshotTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "rates.bin")
+
+        patcher = patch.multiple(
+            settings, RATES_SNAPSHOT_PATH=self.path, RATES_SNAPSHOT_CHECK_INTERVAL=0
+        )
+        patcher.start()
+
+        self.addCleanup(patcher.stop)
+
+        CurrencyRate.objects.invalidate()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+        CurrencyRate.objects._snapshot_source = None
+        CurrencyRate.objects.snapshot_generation = None
+        CurrencyRate.objects.invalidate()
+
+    def test_rates_from_snapshot(self):
+        CurrencyRate.objects.create(currency="EUR", rate="0.50")
+        CurrencyRate.objects.create(currency="USD", rate="1.00")
+        CurrencyRate.objects.create(currency="EUR", rate="0.25", year=2013, month=10)
+        CurrencyRate.objects.create(currency="USD", rate="1.00", year=2013, month=10)
+
+        stdout = StringIO()
+
+        with self.assertNumQueries(1):
+            call_command("write_rates_snapshot", stdout=stdout)
+
+        generation = read_generation(self.path)
+
+        self.assertEqual(
+            stdout.getvalue().strip(),
+            "Wrote generation {} to {}".format(generation, self.path),
+        )
+
+        with self.assertNumQueries(0):
+            self.assertEqual(convert_amount("EUR", "USD", 15), 30)
+            self.assertEqual(convert_amount("EUR", "USD", 15, year=2013, month=10), 60)
+
+            rates = CurrencyRate.objects.get_currency_rates(2013, 10)
+
+            self.assertEqual(str(rates["EUR"].rate), "0.25")
+            self.assertEqual(rates["EUR"].year, 2013)
+
+            # Periods missing from the snapshot fall back to default rates
+            self.assertEqual(convert_amount("EUR", "USD", 15, year=2012, month=1), 30)
+
+        CurrencyRate.objects.filter(currency="EUR", year__isnull=True).update(
+            rate="0.75"
+        )
+        CurrencyRate.objects.invalidate()
+
+        # Rates are read from the snapshot until it is written again
+        self.assertEqual(convert_amount("EUR", "USD", 15), 30)
+
+        CurrencyRate.objects.write_snapshot()
+
+        self.assertEqual(convert_amount("EUR", "USD", 15), 20)
+        self.assertGreater(CurrencyRate.objects.snapshot_generation, generation)
+
+    def test_sync_writes_snapshot(self):
+        provider = FakeProvider(rates={"EUR": 0.5, "USD": 1})
+
+        sync(provider)
+
+        generation = read_generation(self.path)
+
+        self.assertGreater(generation, 0)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(convert_amount("EUR", "USD", 15), 30)
+
+        sync(FakeProvider(rates={"EUR": 0.75, "USD": 1}))
+
+        self.assertGreater(read_generation(self.path), generation)
+        self.assertEqual(convert_amount("EUR", "USD", 15), 20)
+
+
+class SharedSnapshotTests(TestCase):
+    def setUp(self):
+        caches["default"].clear()
+
+        patcher = patch.multiple(
+            settings,
+            RATES_SHARED_CACHE_ALIAS="default",
+            RATES_SNAPSHOT_CHECK_INTERVAL=0,
+        )
+        patcher.start()
+
+        self.addCleanup(patcher.stop)
+
+        CurrencyRate.objects.invalidate()
+
+    def tearDown(self):
+        caches["default"].clear()
+
+        CurrencyRate.objects._snapshot_source = None
+        CurrencyRate.objects.snapshot_generation = None
+        CurrencyRate.objects.invalidate()
+
+    def test_shared_snapshot(self):
+        shared = SharedSnapshot("default", interval=0)
+
+        self.assertIsNone(shared.get())
+
+        generation = publish(PERIODS, "default")
+
+        snapshot = shared.get()
+
+        self.assertEqual(snapshot.generation, generation)
+        self.assertEqual(snapshot.get_rates(2013, 10)["EUR"], Decimal("0.73"))
+        self.assertIs(shared.get(), snapshot)
+
+        self.assertEqual(publish(PERIODS, "default"), generation + 1)
+        self.assertEqual(shared.get().generation, generation + 1)
+
+        # The snapshot of a generation is missing until it is stored
+        caches["default"].set(GENERATION_KEY, generation + 2)
+
+        self.assertEqual(shared.get().generation, generation + 1)
+
+        shared.interval = 60
+
+        publish(PERIODS, "default")
+
+        self.assertEqual(shared.get().generation, generation + 1)
+
+    def test_generations(self):
+        cache = caches["default"]
+
+        generations = []
+
+        threads = [
+            threading.Thread(target=lambda: generations.append(next_generation(cache)))
+            for i in range(10)
+        ]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(set(generations)), 10)
+
+        # Counters restart above previous generations once evicted
+        cache.delete(COUNTER_KEY)
+
+        self.assertGreater(next_generation(cache), max(generations))
+
+    def test_unavailable_cache(self):
+        shared = SharedSnapshot("default", interval=0)
+
+        publish(PERIODS, "default")
+
+        snapshot = shared.get()
+
+        with patch.object(caches["default"], "get", side_effect=ConnectionError):
+            self.assertIs(shared.get(), snapshot)
+
+    def test_sync_publishes_snapshot(self):
+        sync(FakeProvider(rates={"EUR": 0.5, "USD": 1}))
+
+        generation = caches["default"].get(GENERATION_KEY)
+
+        self.assertIsNotNone(generation)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(convert_amount("EUR", "USD", 15), 30)
+
+        # Another process syncs new rates
+        CurrencyRate.objects.filter(currency="EUR").update(rate="0.75")
+
+        stdout = StringIO()
+
+        call_command("write_rates_snapshot", alias="default", stdout=stdout)
+
+        self.assertEqual(
+            stdout.getvalue().strip(),
+            "Published generation {} to the default cache".format(generation + 1),
+        )
+
+        with self.assertNumQueries(0):
+            self.assertEqual(convert_amount("EUR", "USD", 15), 20)
+
+        self.assertEqual(CurrencyRate.objects.snapshot_generation, generation + 1)
@@ -1,4 +1,8 @@
 import datetime
+import threading
+import time
+
+from itertools import islice
 
 from django.conf import settings
 
@@ -29,3 +33,38 @@ def set_cookie(response, key, value, days_expire=7, cookie_domain=None):
 def chunks(l, n):
     for i in xrange(0, len(l), n):
         yield l[i : i + n]
+
+
+def batches(iterable, n):
+    iterator = iter(iterable)
+
+    while True:
+        batch = list(islice(iterator, n))
+
+        if not batch:
+            return
+
+        yield batch
+
+
+class RateLimiter(object):
+    """Space the calls returning from `wait` by `1 / rate` seconds, across
+    threads. There is no limit when `rate` is None.
+    """
+
+    def __init__(self, rate=None):
+        self.interval = 1.0 / rate if rate else 0
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+
+        if delay > 0:
+            time.sleep(delay)
@@ -0,0 +1,87 @@
+import logging
+import time
+
+from django.db import connections
+
+from . import settings
+from .geoip import get_reader
+from .models import CurrencyRate, currencies, locations, timezones
+
+
+logger = logging.getLogger("django.metasettings")
+
+
+def warmup_currencies():
+    for name in (
+        "currencies",
+        "trigrams",
+        "labels",
+        "symbols",
+        "currency_by_countries",
+        "countries",
+    ):
+        getattr(currencies, name)
+
+
+def warmup_timezones():
+    timezones.timezones
+
+
+def warmup_locations():
+    locations.bundles
+
+
+def warmup_rates():
+    CurrencyRate.objects.get_currency_rates()
+
+
+def warmup_geoip():
+    get_reader()
+
+
+def close_connections():
+    """Close database connections opened while warming up, processes
+    forked afterwards must not share their sockets. Connections of an
+    ongoing transaction are left open.
+    """
+    for connection in connections.all():
+        if not connection.in_atomic_block:
+            connection.close()
+
+
+STEPS = (
+    ("currencies", warmup_currencies),
+    ("timezones", warmup_timezones),
+    ("locations", warmup_locations),
+    ("rates", warmup_rates),
+    ("geoip", warmup_geoip),
+)
+
+
+def warmup(steps=None):
+    """Build lazily initialised structures up front, for instance before
+    forking workers so they share memory pages. Database connections are
+    closed afterwards.
+
+    Returns a list of `(step, seconds, error)` tuples.
+    """
+    results = []
+
+    for name, func in STEPS:
+        if steps is not None and name not in steps:
+            continue
+
+        start = time.perf_counter()
+        error = None
+
+        try:
+            func()
+        except Exception as e:
+            logger.warning("Unable to warm up %s: %s", name, e)
+            error = e
+
+        results.append((name, time.perf_counter() - start, error))
+
+    close_connections()
+
+    return results
@@ -0,0 +1,15 @@
+"""Initialisation of the worker processes of bulk GeoIP lookups.
+
+This module must not access Django settings at import time: pools started
+with "spawn" or "forkserver" import it before the settings are configured.
+"""
+
+
+def initialize(options):
+    """Configure Django with `options` unless settings are already available,
+    as in workers forked from a configured process.
+    """
+    from django.conf import settings
+
+    if not settings.configured:
+        settings.configure(**options)
@@ -18,12 +18,16 @@ setup(
     author_email='florent.messa@gmail.com',
     url='http://github.com/thoas/django-metasettings',
     packages=find_packages(),
+    python_requires='>=3.8',
     install_requires=[
+        'Django>=3.2',
     ],
     zip_safe=False,
     include_package_data=True,
     classifiers=[
         'Environment :: Web Environment',
+        'Framework :: Django',
+        'Framework :: Django :: 3.2',
         'Intended Audience :: Developers',
         'License :: OSI Approved :: MIT License',
         'Operating System :: OS Independent',